@@ -120,7 +120,7 @@ setup(
     #
     # For an analysis of "install_requires" vs pip's requirements files see:
     # https://packaging.python.org/discussions/install-requires-vs-requirements/
-    install_requires=["numpy", "scipy", "flask", "gym", "flask-socketio", "flask_cors", "requests", "deepdiff"],
+    install_requires=["numpy", "scipy", "flask", "gym>=0.26", "flask-socketio", "flask_cors", "requests", "deepdiff"],
     # Optional
     # List additional groups of dependencies here (e.g. development
     # dependencies). Users will be able to install these using the "extras"
@@ -132,6 +132,8 @@ setup(
     # projects.
     extras_require={  # Optional
         "torch": ["torch"],
+        "asgi": ["uvicorn"],
+        "async-client": ["aiohttp"],
     },
     # If there are data files included in your packages that need to be
     # installed, specify them here.
@@ -19,3 +19,17 @@ tool_config = {
         "func": None,
     },
 }
+
+# Optional tools needing extra models or packages, not enabled by default.
+# Enable them by passing e.g. `tool_config={**tool_config, **optional_tool_config}` to `run_addon_server()`.
+
+optional_tool_config = {
+    "sentence-encoder": {
+        "external-name": "sentence-encoder",
+        "file": "SentenceEncoder",
+        "class": "SentenceEncoderTool",
+        "func": None,
+        # Worker processes are forked when the tool loads, so serve it with load_mode="eager".
+        "config": {"processes": 4, "threads_per_process": 1},
+    },
+}
@@ -8,3 +8,8 @@ A sample simple tool, that its __call__() is used when handling requests.
 class SampleTool:
     def __call__(self, body):
         return body  # echoing
+
+    def warmup(self):
+        # Optional: called once before the tool is marked ready.
+        # Returned items are sent to __call__() as sample payloads.
+        return [{"message": "warmup"}]
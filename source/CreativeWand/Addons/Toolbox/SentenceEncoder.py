@@ -0,0 +1,39 @@
+"""
+SentenceEncoder.py
+
+A tool serving InferSent sentence embeddings and highlights from a pool of encoder processes
+(see `CreativeWand.Utils.UniqueSentences.EncoderPool`).
+
+Requests are either {"sentences": [...]}, answered with {"embeddings": [[...], ...]},
+or {"documents": [[...], ...]}, answered with {"highlights": [...]} (see `HighlighterInterface.highlight_many()`).
+"""
+
+
+class SentenceEncoderTool:
+    def __init__(self, config=None):
+        """
+        :param config: (dict) may contain:
+            "processes" - number of encoder processes (default: number of CPUs);
+            "threads_per_process" - intra-op threads of each process (default 1);
+            "model_path", "w2v_path", "quantize", "vocab_dtype" - passed to `HighlighterModel.load()`.
+        """
+        from CreativeWand.Utils.UniqueSentences.UniqueSentences import HighlighterModel
+        from CreativeWand.Utils.UniqueSentences.EncoderPool import EncoderPool
+
+        if config is None:
+            config = {}
+        load_kwargs = {k: config[k] for k in ["model_path", "w2v_path", "quantize", "vocab_dtype"] if k in config}
+        self.model = HighlighterModel.load(**load_kwargs)
+        self.pool = EncoderPool(self.model, processes=config.get("processes", None),
+                                threads_per_process=config.get("threads_per_process", 1))
+
+    def __call__(self, body):
+        from CreativeWand.Utils.UniqueSentences.UniqueSentences import HighlighterInterface
+
+        if "documents" in body:
+            return {"highlights": HighlighterInterface.highlight_many(body["documents"], model=self.model)}
+        embeddings = self.model.embedding_cache.encode(body["sentences"], tokenize=True)
+        return {"embeddings": embeddings.tolist()}
+
+    def warmup(self):
+        return [{"documents": [["The cat sat on the mat.", "The dragon flew over the sea."]]}]
@@ -0,0 +1,46 @@
+"""
+SyntheticLatency.py
+
+A tool with configurable latency, used for load testing addon servers.
+"""
+import asyncio
+import random
+import time
+
+
+class SyntheticLatencyTool:
+    def __init__(self, config=None):
+        """
+        :param config: (dict) may contain:
+            "latency" - seconds each call takes (default 0.05);
+            "jitter" - max random seconds added to each call (default 0);
+            "busy" - if True, spin the CPU instead of sleeping, to simulate compute-bound tools.
+        """
+        if config is None:
+            config = {}
+        self.latency = config.get("latency", 0.05)
+        self.jitter = config.get("jitter", 0.0)
+        self.busy = config.get("busy", False)
+
+    def _duration(self):
+        return self.latency + random.uniform(0, self.jitter)
+
+    def __call__(self, body):
+        duration = self._duration()
+        if self.busy:
+            end = time.perf_counter() + duration
+            while time.perf_counter() < end:
+                pass
+        else:
+            time.sleep(duration)
+        return body  # echoing
+
+
+class AsyncSyntheticLatencyTool(SyntheticLatencyTool):
+    """
+    Same as SyntheticLatencyTool, but awaits instead of sleeping (for the async addon server).
+    """
+
+    async def __call__(self, body):
+        await asyncio.sleep(self._duration())
+        return body  # echoing
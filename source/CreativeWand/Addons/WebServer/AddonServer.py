@@ -6,22 +6,30 @@ for addon tools to be used by the Application.
 """
 from __future__ import annotations
 
-from importlib import import_module
+import logging
+import time
 
 from flask import Flask, request, make_response, jsonify, json
 from CreativeWand.Addons.AddonConfig import tool_config as default_tool_config
-import inspect
+from CreativeWand.Addons.WebServer.ResultCache import CachedCall, MISSING
+from CreativeWand.Addons.WebServer.ServerMetrics import ServerMetrics
+from CreativeWand.Addons.WebServer.ToolLoader import ToolRegistry
 
 """
 Internal variables.
 """
 app = Flask(__name__)
 
-tools = {}
+registry = ToolRegistry()
 
-# Common class prefix appended to every tool definition to find them
-# In Addons/Toolbox folder.
-tool_common_prefix = "CreativeWand.Addons.Toolbox."
+# Loaded tools, keyed by external name.
+tools = registry.tools
+
+metrics = ServerMetrics()
+
+# Request and result dumps are logged at DEBUG level, so they are off unless
+# `log_level` is given to `run_addon_server()`.
+logger = logging.getLogger(__name__)
 
 
 @app.route("/")
@@ -29,6 +37,34 @@ def hello_world():
     return "<p>Hello, World!</p>"
 
 
+@app.route("/healthz")
+def healthz():
+    """
+    Liveness check: the server is up and handling requests.
+    """
+    return make_response(jsonify({"status": "ok"}), 200)
+
+
+@app.route("/readyz")
+def readyz():
+    """
+    Readiness check: every configured tool is loaded (or will be loaded on its first call in lazy mode).
+    """
+    if not registry.is_ready():
+        return make_response(jsonify({"status": "loading", "tools": registry.status}), 503)
+    return make_response(jsonify({"status": "ready", "tools": registry.status}), 200)
+
+
+@app.route("/metrics")
+def export_metrics():
+    """
+    Per-tool request metrics in Prometheus text format.
+    """
+    response = make_response(metrics.render(), 200)
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return response
+
+
 @app.route("/api/<name>", methods=["POST"])
 def call_api(name: str):
     data = request.data
@@ -39,23 +75,65 @@ def call_api(name: str):
             jsonify({"message": "Invalid Input"}),
             400,
         )
-    print("%s is called with data %s." % (name, data))
-    if name not in tools:
+    logger.debug("%s is called with data %s.", name, data)
+    if name not in registry.specs:
         return make_response(
             jsonify({"message": "Unknown Tools"}),
             404,
         )
-    else:
-        print(tools[name])
-        result = tools[name]['object'](data)
-        print(result)
-        return make_response(
-            jsonify(result),
-            200,
+    try:
+        tool = registry.get(name)
+    except Exception:
+        logger.exception("Failed to load tool %s.", name)
+        tool = None
+    if tool is None:
+        response = make_response(
+            jsonify({"message": "Tool Not Ready", "status": registry.status[name]}),
+            503,
         )
+        response.headers["Retry-After"] = "5"
+        return response
 
+    metrics.request_started(name, len(request.data))
+    start_time = time.perf_counter()
+    response = None
+    try:
+        response = _call_tool(name, tool, data)
+        return response
+    finally:
+        # An exception raised by the tool ends up as a 500 from flask.
+        metrics.request_finished(
+            name,
+            response.status_code if response is not None else 500,
+            time.perf_counter() - start_time,
+            len(response.get_data()) if response is not None else None,
+        )
 
-def run_addon_server(tools_to_enable=None, tool_config=None):
+
+def _call_tool(name: str, tool: dict, data: object):
+    """
+    Run a loaded tool on a decoded payload, going through its result cache if it has one.
+    :param name: external name of the tool.
+    :param tool: loaded tool entry.
+    :param data: decoded json payload.
+    :return: flask response.
+    """
+    call = CachedCall(tool['cache'], name, data, metrics)
+    result = call.lookup()
+    if result is MISSING:
+        result = tool['object'](data)
+        call.store(result)
+    logger.debug("%s returned %s.", name, result)
+    response = make_response(
+        jsonify(result),
+        200,
+    )
+    response.headers.update(call.headers)
+    return response
+
+
+def run_addon_server(tools_to_enable=None, tool_config=None, log_level=None, load_mode="eager",
+                     host="0.0.0.0", port=8765):
     """
     Start the addon server.
     tool_config should be in this format:
@@ -64,69 +142,51 @@ def run_addon_server(tools_to_enable=None, tool_config=None):
             "config": { # They are directly passed as `config` parameter for `__init__()`
                 "key1": "value1",
                 "key2": "value2",
-            }
+            },
+            "cache": { # Optional, only use it for deterministic tools
+                "size": 128, # Max number of results kept in memory (LRU)
+                "ttl": 3600, # Seconds before a result expires, or None to never expire
+                "disk": "/tmp/pnb-cache", # Optional directory shared by all workers
+                "disk_size": 10000, # Max number of results kept on disk, oldest are removed first
+            },
+            "warmup": [ # Optional sample payloads sent to the tool before it is marked ready
+                {"key": "value"},
+            ],
         },
+    A tool class may also define `warmup(self)`, which is called once after the tool is created;
+    if it returns a list, the items are used as additional sample payloads.
     :param tools_to_enable: (list) if not None, will ignore any tool in `tool_config` that is not in it.
     :param tool_config: (dict) tool config dictionary (see main comment)
+    :param log_level: (int or str) if not None, enable logging at this level (e.g. "DEBUG" to dump requests).
+    :param load_mode: (str) eager | background | lazy:
+        eager - load every tool before the server starts;
+        background - start the server right away and load tools in a background thread (see `/readyz`);
+        lazy - load each tool on its first call.
+        Calls to a tool that is not loaded yet get a 503 response.
+    :param host: host to bind.
+    :param port: port to bind.
 
     :return:
     """
     import sys
+    if log_level is not None:
+        logging.basicConfig(level=log_level)
+        logger.setLevel(log_level)
+
     if tools_to_enable is None:
         if len(sys.argv) > 1:
-            print("Using arguments from command line, will only enable these tools.")
+            logger.info("Using arguments from command line, will only enable these tools.")
             tools_to_enable = sys.argv[1:]
 
     if tool_config is None:
         tool_config = default_tool_config
 
     # Load config file and use them to load tools needed for the server.
-    for k, v in tool_config.items():
-
-        # If "external-name" is set in tool config, use that name instead. Otherwise use entry name.
-        tool_external_name = v['external-name'] if 'external-name' in v else k
-
-        if tools_to_enable is not None and k not in tools_to_enable:
-            print("Skipping loading tool %s." % k)
-            continue
-
-        filename = v['file'] if 'file' in v else None
-        classname = v['class']
-
-        if 'config' in v:
-            config = v['config']
-        else:
-            config = None
-        if 'func' in v:
-            funcname = v['func']
-            if funcname is not None:
-                print("WARNING - funcname is not supported yet. Only __call__() will be used.")
-        else:
-            funcname = None
-
-        if inspect.isclass(classname):
-            tool_class = classname
-        elif type(classname) is str:
-            # Creating using str - Will only work with specific dir structure, deprecated
-            python_filepath = tool_common_prefix + filename
-            module = import_module(python_filepath)
-            tool_class = getattr(module, classname)
-        else:
-            raise AttributeError("classname not a str or class: %s" % classname)
-
-        if config:
-            tool_object = tool_class(config)
-        else:
-            tool_object = tool_class()
-        if tool_external_name in tools:
-            raise AttributeError("Trying to create two services with the same external name: %s !" % tool_external_name)
-        tools[tool_external_name] = {
-            "object": tool_object,
-            "func": funcname,
-        }
-    print("Loaded tool objects: %s" % tools)
-
-    app.run(host="0.0.0.0", port=8765)
+    registry.set_load_mode(load_mode)
+    registry.register(tool_config, tools_to_enable=tools_to_enable)
+    registry.start()
+
+    app.run(host=host, port=port)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,265 @@
+"""
+AsyncAddonServer.py
+
+This file contains an ASGI variant of `AddonServer.py`, better suited for I/O-bound tools
+(e.g. tools proxying another model server).
+
+Tools may define `async def __call__(self, body)`, which is awaited on the event loop;
+tools with a regular `__call__()` are offloaded to a thread pool.
+Tools are loaded from the same `tool_config` format (see `AddonConfig.py`) and serve the same routes.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from CreativeWand.Addons.AddonConfig import tool_config as default_tool_config
+from CreativeWand.Addons.WebServer.ResultCache import CachedCall, MISSING
+from CreativeWand.Addons.WebServer.ServerMetrics import ServerMetrics
+from CreativeWand.Addons.WebServer.ToolLoader import ToolRegistry, is_async_tool
+
+logger = logging.getLogger(__name__)
+
+# Prefix of the routes calling tools.
+api_prefix = "/api/"
+
+
+def _encode(obj: object) -> bytes:
+    return json.dumps(obj).encode("utf-8")
+
+
+class AsyncAddonApp:
+    """
+    A minimal ASGI application exposing the tools in a ToolRegistry.
+    """
+
+    def __init__(self, registry: ToolRegistry, metrics: ServerMetrics = None, max_workers: int = None):
+        """
+        Create the application.
+        :param registry: registry holding the tools to serve. Loading starts on ASGI lifespan startup.
+            Async warmups of its tools are run on the serving event loop.
+        :param metrics: metrics registry, or None to create one.
+        :param max_workers: (int) size of the thread pool used for sync tools and tool loading.
+        """
+        self.registry = registry
+        self.metrics = metrics if metrics is not None else ServerMetrics()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._loop = None
+        self._warmups = {}
+        """
+        Async warmups scheduled on the serving loop, as tool name -> concurrent future of the tool entry.
+        """
+        registry.async_warmup_handler = self._schedule_warm_up
+
+    def _schedule_warm_up(self, name: str, warmup) -> None:
+        """
+        Run an async tool warmup on the serving loop. Called from the thread loading the tool.
+        """
+        future = asyncio.run_coroutine_threadsafe(warmup, self._loop)
+        if self.registry.load_mode == "background":
+            # Nobody waits for it, failures would go unnoticed.
+            future.add_done_callback(lambda f: self._log_warm_up_error(name, f))
+        self._warmups[name] = future
+
+    @staticmethod
+    def _log_warm_up_error(name: str, future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Failed to warm up tool %s: %r", name, future.exception())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        path = scope["path"]
+        if path == "/":
+            await self._respond(send, 200, b"<p>Hello, World!</p>", content_type="text/html; charset=utf-8")
+        elif path == "/healthz":
+            await self._respond_json(send, 200, {"status": "ok"})
+        elif path == "/readyz":
+            if self.registry.is_ready():
+                await self._respond_json(send, 200, {"status": "ready", "tools": self.registry.status})
+            else:
+                await self._respond_json(send, 503, {"status": "loading", "tools": self.registry.status})
+        elif path == "/metrics":
+            await self._respond(send, 200, self.metrics.render().encode("utf-8"),
+                                content_type="text/plain; version=0.0.4; charset=utf-8")
+        elif path.startswith(api_prefix):
+            if scope["method"] != "POST":
+                await self._respond_json(send, 405, {"message": "Method Not Allowed"})
+                return
+            body = await self._read_body(receive)
+            status, response_body, headers = await self.call_api(path[len(api_prefix):], body)
+            await self._respond(send, status, response_body, content_type="application/json", headers=headers)
+        else:
+            await self._respond_json(send, 404, {"message": "Not Found"})
+
+    async def call_api(self, name: str, body: bytes) -> tuple:
+        """
+        Handle a tool call.
+        :param name: external name of the tool.
+        :param body: raw request body.
+        :return: (status code, json-encoded response body, extra headers).
+        """
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400, _encode({"message": "Invalid Input"}), {}
+        logger.debug("%s is called with data %s.", name, data)
+        if name not in self.registry.specs:
+            return 404, _encode({"message": "Unknown Tools"}), {}
+
+        tool = self.registry.tools.get(name)
+        if tool is None and self.registry.load_mode == "lazy":
+            try:
+                self._loop = asyncio.get_running_loop()
+                tool = await self._loop.run_in_executor(self.executor, self.registry.load, name)
+                if tool is None and name in self._warmups:
+                    tool = await asyncio.wrap_future(self._warmups[name])
+            except Exception:
+                logger.exception("Failed to load tool %s.", name)
+        if tool is None:
+            return 503, _encode({"message": "Tool Not Ready", "status": self.registry.status[name]}), \
+                {"Retry-After": "5"}
+
+        self.metrics.request_started(name, len(body))
+        start_time = time.perf_counter()
+        status, response_body, headers = 500, _encode({"message": "Internal Server Error"}), {}
+        try:
+            result, headers = await self._call_tool(name, tool, data)
+            response_body = _encode(result)
+            status = 200
+        except Exception:
+            logger.exception("Exception when calling tool %s.", name)
+        finally:
+            self.metrics.request_finished(name, status, time.perf_counter() - start_time,
+                                          len(response_body) if status == 200 else None)
+        return status, response_body, headers
+
+    async def _call_tool(self, name: str, tool: dict, data: object) -> tuple:
+        """
+        Run a loaded tool on a decoded payload, going through its result cache if it has one.
+        :param name: external name of the tool.
+        :param tool: loaded tool entry.
+        :param data: decoded json payload.
+        :return: (result, extra headers).
+        """
+        loop = asyncio.get_running_loop()
+        call = CachedCall(tool['cache'], name, data, self.metrics)
+        # The disk tier reads and writes files, which must not block the event loop.
+        if call.uses_disk:
+            result = await loop.run_in_executor(self.executor, call.lookup)
+        else:
+            result = call.lookup()
+        if result is MISSING:
+            tool_object = tool['object']
+            if is_async_tool(tool_object):
+                result = await tool_object(data)
+            else:
+                result = await loop.run_in_executor(self.executor, tool_object, data)
+            if call.uses_disk:
+                await loop.run_in_executor(self.executor, call.store, result)
+            else:
+                call.store(result)
+        logger.debug("%s returned %s.", name, result)
+        return result, call.headers
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self._loop = asyncio.get_running_loop()
+                    await self._loop.run_in_executor(self.executor, self.registry.start)
+                    if self.registry.load_mode == "eager":
+                        await asyncio.gather(*(asyncio.wrap_future(future) for future in self._warmups.values()))
+                except Exception as e:
+                    logger.exception("Failed to load tools.")
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                return body
+
+    @staticmethod
+    async def _respond(send, status: int, body: bytes, content_type: str, headers: dict = None):
+        raw_headers = [
+            (b"content-type", content_type.encode("latin-1")),
+            (b"content-length", str(len(body)).encode("latin-1")),
+        ]
+        if headers:
+            raw_headers += [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
+        await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _respond_json(self, send, status: int, obj: object, headers: dict = None):
+        await self._respond(send, status, _encode(obj), content_type="application/json", headers=headers)
+
+
+"""
+Internal variables.
+"""
+registry = ToolRegistry()
+
+app = AsyncAddonApp(registry)
+
+
+def run_async_addon_server(tools_to_enable=None, tool_config=None, log_level=None, load_mode="eager",
+                           host="0.0.0.0", port=8765, access_log=True):
+    """
+    Start the ASGI addon server with uvicorn (`pip install uvicorn`).
+    :param tools_to_enable: (list) if not None, will ignore any tool in `tool_config` that is not in it.
+    :param tool_config: (dict) tool config dictionary, same format as `AddonServer.run_addon_server()`.
+    :param log_level: (int or str) if not None, enable logging at this level (e.g. "DEBUG" to dump requests),
+        uvicorn logs included.
+    :param load_mode: (str) eager | background | lazy, see `AddonServer.run_addon_server()`.
+    :param host: host to bind.
+    :param port: port to bind.
+    :param access_log: if False, uvicorn does not log every request.
+    :return:
+    """
+    import sys
+    try:
+        import uvicorn
+    except ImportError:
+        raise ImportError("uvicorn is needed to run the async addon server: pip install uvicorn")
+
+    if log_level is not None:
+        logging.basicConfig(level=log_level)
+        logger.setLevel(log_level)
+
+    if tools_to_enable is None:
+        if len(sys.argv) > 1:
+            logger.info("Using arguments from command line, will only enable these tools.")
+            tools_to_enable = sys.argv[1:]
+
+    if tool_config is None:
+        tool_config = default_tool_config
+
+    registry.set_load_mode(load_mode)
+    registry.register(tool_config, tools_to_enable=tools_to_enable)
+
+    uvicorn_kwargs = {}
+    if log_level is not None:
+        uvicorn_kwargs["log_level"] = log_level.lower() if isinstance(log_level, str) else log_level
+    uvicorn.run(app, host=host, port=port, lifespan="on", access_log=access_log, **uvicorn_kwargs)
+
+
+if __name__ == '__main__':
+    run_async_addon_server()
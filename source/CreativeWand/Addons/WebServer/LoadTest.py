@@ -0,0 +1,239 @@
+"""
+LoadTest.py
+
+A load generator measuring throughput and latency of the addon servers.
+
+It starts an addon server locally in a subprocess (flask or asgi mode), serving either `SampleTool`
+or a synthetic-latency tool, then sweeps concurrency levels with the sync, pooled and async
+`RemoteAPIInterface` clients and prints a throughput/latency table.
+
+Usage:
+    python -m CreativeWand.Addons.WebServer.LoadTest --server flask asgi --tool synthetic --concurrency 1 8 32
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from CreativeWand.Utils.Network.RemoteAPI import RemoteAPIInterface, PooledRemoteAPIInterface, \
+    AsyncRemoteAPIInterface
+
+# Supported server modes and client kinds.
+server_modes = ["flask", "asgi"]
+client_kinds = ["sync", "pooled", "async"]
+
+table_columns = ["server", "tool", "client", "concurrency", "requests", "errors", "rps", "p50_ms", "p99_ms"]
+
+
+def _build_tool_config(tool: str, server: str, latency: float, busy: bool) -> dict:
+    """
+    Build the tool config served during the load test.
+    :param tool: sample | synthetic.
+    :param server: server mode, used to pick the async synthetic tool for asgi.
+    :param latency: seconds each synthetic call takes.
+    :param busy: whether synthetic calls spin the CPU instead of sleeping.
+    :return: tool config with a single tool.
+    """
+    if tool == "sample":
+        return {"sample": {"file": "Sample", "class": "SampleTool"}}
+    class_name = "AsyncSyntheticLatencyTool" if server == "asgi" and not busy else "SyntheticLatencyTool"
+    return {
+        "synthetic": {
+            "file": "SyntheticLatency",
+            "class": class_name,
+            "config": {"latency": latency, "busy": busy},
+        }
+    }
+
+
+def _serve(server: str, tool_config: dict, port: int) -> None:
+    """
+    Subprocess entry point running an addon server.
+    """
+    if server == "flask":
+        from CreativeWand.Addons.WebServer.AddonServer import run_addon_server
+        # Per-request access logs would be measured as well.
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        run_addon_server(tools_to_enable=list(tool_config.keys()), tool_config=tool_config,
+                         host="127.0.0.1", port=port)
+    else:
+        from CreativeWand.Addons.WebServer.AsyncAddonServer import run_async_addon_server
+        run_async_addon_server(tools_to_enable=list(tool_config.keys()), tool_config=tool_config,
+                               host="127.0.0.1", port=port, log_level="WARNING", access_log=False)
+
+
+def start_server(server: str, tool_config: dict, port: int, timeout: float = 60) -> multiprocessing.Process:
+    """
+    Start an addon server in a subprocess and wait until it is ready.
+    :param server: flask | asgi.
+    :param tool_config: tool config to serve.
+    :param port: port to bind on localhost.
+    :param timeout: seconds to wait for readiness.
+    :return: server process.
+    """
+    process = multiprocessing.Process(target=_serve, args=(server, tool_config, port), daemon=True)
+    process.start()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get("http://127.0.0.1:%s/readyz" % port, timeout=1).status_code == 200:
+                return process
+        except requests.exceptions.RequestException:
+            pass
+        if not process.is_alive():
+            break
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("%s addon server did not become ready on port %s." % (server, port))
+
+
+def _run_threaded(request_func, address: str, payload: dict, concurrency: int, n_requests: int) -> tuple:
+    def one(_):
+        start_time = time.perf_counter()
+        response = request_func(method="POST", address=address, data=payload)
+        return time.perf_counter() - start_time, response.success
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(n_requests)))
+    return [r[0] for r in results], sum(1 for r in results if not r[1])
+
+
+async def _run_async(address: str, payload: dict, concurrency: int, n_requests: int) -> tuple:
+    client = AsyncRemoteAPIInterface(pool_size=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start_time = time.perf_counter()
+            response = await client.request(method="POST", address=address, data=payload)
+            return time.perf_counter() - start_time, response.success
+
+    try:
+        results = await asyncio.gather(*[one() for _ in range(n_requests)])
+    finally:
+        await client.close()
+    return [r[0] for r in results], sum(1 for r in results if not r[1])
+
+
+def run_client(client: str, address: str, payload: dict, concurrency: int, n_requests: int) -> dict:
+    """
+    Send requests with one client kind and measure them.
+    :param client: sync | pooled | async.
+    :param address: url of the tool.
+    :param payload: payload sent with every request.
+    :param concurrency: number of requests in flight at the same time.
+    :param n_requests: total number of requests.
+    :return: dict with "requests", "errors", "rps", "p50_ms" and "p99_ms".
+    """
+    start_time = time.perf_counter()
+    if client == "sync":
+        latencies, errors = _run_threaded(RemoteAPIInterface.request, address, payload, concurrency, n_requests)
+    elif client == "pooled":
+        pooled = PooledRemoteAPIInterface(pool_size=concurrency)
+        try:
+            latencies, errors = _run_threaded(pooled.request, address, payload, concurrency, n_requests)
+        finally:
+            pooled.close()
+    elif client == "async":
+        latencies, errors = asyncio.run(_run_async(address, payload, concurrency, n_requests))
+    else:
+        raise ValueError("Unknown client %s. Supported: %s" % (client, client_kinds))
+    elapsed = time.perf_counter() - start_time
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": n_requests,
+        "errors": errors,
+        "rps": n_requests / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def run_load_test(servers=None, tool="sample", clients=None, concurrency_levels=None, n_requests=200,
+                  latency=0.05, busy=False, payload_size=64, port=8799) -> list:
+    """
+    Sweep server modes, clients and concurrency levels.
+    :param servers: (list) server modes to test, default all.
+    :param tool: sample | synthetic.
+    :param clients: (list) client kinds to test, default all.
+    :param concurrency_levels: (list) concurrency levels to sweep, default [1, 4, 16, 64].
+    :param n_requests: requests sent per (server, client, concurrency) combination.
+    :param latency: seconds each synthetic tool call takes.
+    :param busy: whether the synthetic tool spins the CPU instead of sleeping.
+    :param payload_size: number of characters in the payload sent.
+    :param port: port used by the local server.
+    :return: list of result rows (dicts keyed by `table_columns`).
+    """
+    if servers is None:
+        servers = server_modes
+    if clients is None:
+        clients = client_kinds
+    if concurrency_levels is None:
+        concurrency_levels = [1, 4, 16, 64]
+    payload = {"message": "x" * payload_size}
+
+    rows = []
+    for server in servers:
+        tool_config = _build_tool_config(tool, server, latency, busy)
+        tool_name = list(tool_config.keys())[0]
+        address = "http://127.0.0.1:%s/api/%s" % (port, tool_name)
+        process = start_server(server, tool_config, port)
+        try:
+            for client in clients:
+                # Warm up connections and the tool before measuring.
+                run_client(client, address, payload, 1, 5)
+                for concurrency in concurrency_levels:
+                    row = {"server": server, "tool": tool_name, "client": client, "concurrency": concurrency}
+                    row.update(run_client(client, address, payload, concurrency, n_requests))
+                    rows.append(row)
+                    print(format_row(row), flush=True)
+        finally:
+            process.terminate()
+            process.join()
+    return rows
+
+
+def format_row(row: dict) -> str:
+    return "%-6s %-10s %-7s %11d %8d %6d %9.1f %8.2f %8.2f" % tuple(row[k] for k in table_columns)
+
+
+def format_table(rows: list) -> str:
+    """
+    Format result rows as a text table.
+    :param rows: result rows from `run_load_test()`.
+    :return: table text.
+    """
+    header = "%-6s %-10s %-7s %11s %8s %6s %9s %8s %8s" % tuple(table_columns)
+    return "\n".join([header] + [format_row(row) for row in rows])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the addon servers.")
+    parser.add_argument("--server", nargs="+", default=server_modes, choices=server_modes)
+    parser.add_argument("--tool", default="sample", choices=["sample", "synthetic"])
+    parser.add_argument("--client", nargs="+", default=client_kinds, choices=client_kinds)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="requests per measurement")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per synthetic tool call")
+    parser.add_argument("--busy", action="store_true", help="synthetic tool spins the CPU instead of sleeping")
+    parser.add_argument("--payload-size", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--output", default=None, help="if set, also save results as json to this path")
+    args = parser.parse_args()
+
+    print(format_table([]))
+    results = run_load_test(servers=args.server, tool=args.tool, clients=args.client,
+                            concurrency_levels=args.concurrency, n_requests=args.requests,
+                            latency=args.latency, busy=args.busy, payload_size=args.payload_size, port=args.port)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,251 @@
+"""
+ResultCache.py
+
+This file contains a result cache used by the addon server to skip
+recomputing identical requests sent to deterministic tools.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Used as the "not found" value since None is a valid tool result.
+MISSING = object()
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    An in-memory LRU cache with optional time-to-live, backed by an optional on-disk tier.
+    The on-disk tier is a directory of json files and can be shared by multiple server workers.
+    Expired files are removed when read, and the oldest files are removed once there are more than `disk_size`.
+    """
+
+    def __init__(self, size: int = 128, ttl: float = None, disk_path: str = None, disk_size: int = 10000):
+        """
+        Initialize a result cache.
+        :param size: (int) max number of results kept in memory.
+        :param ttl: (float) seconds before a result expires, or None to never expire.
+        :param disk_path: (str) if not None, directory used as the shared on-disk tier.
+        :param disk_size: (int) max number of results kept on disk, or None for no limit.
+        """
+        self.size = size
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.disk_size = disk_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        """
+        Disk writes since the disk tier was last trimmed.
+        """
+
+        self.hits = 0
+        self.misses = 0
+
+        if self.disk_path is not None:
+            os.makedirs(self.disk_path, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config: dict) -> ResultCache:
+        """
+        Create a cache from the `cache` entry of a tool config.
+        :param config: (dict) may contain "size", "ttl", "disk" and "disk_size".
+        :return: created cache.
+        """
+        return cls(
+            size=config.get("size", 128),
+            ttl=config.get("ttl", None),
+            disk_path=config.get("disk", None),
+            disk_size=config.get("disk_size", 10000),
+        )
+
+    @staticmethod
+    def make_key(name: str, data: object) -> str:
+        """
+        Create a cache key from the tool name and the request payload.
+        :param name: name of the tool.
+        :param data: decoded json payload.
+        :return: hex digest used as cache key.
+        """
+        payload = json.dumps([name, data], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def get(self, key: str) -> object:
+        """
+        Look up a result, first in memory and then on disk.
+        :param key: cache key.
+        :return: cached result, or MISSING if there is none.
+        """
+        with self._lock:
+            if key in self._entries:
+                created_at, result = self._entries[key]
+                if not self._expired(created_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._entries[key]
+
+        created_at, result = self._disk_get(key)
+        with self._lock:
+            if result is MISSING:
+                self.misses += 1
+                return MISSING
+            self._put_memory(key, created_at, result)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, result: object) -> None:
+        """
+        Store a result in both tiers.
+        :param key: cache key.
+        :param result: json-serializable result.
+        :return: None.
+        """
+        created_at = time.time()
+        with self._lock:
+            self._put_memory(key, created_at, result)
+        self._disk_put(key, created_at, result)
+
+    def _put_memory(self, key: str, created_at: float, result: object) -> None:
+        self._entries[key] = (created_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def _disk_file(self, key: str) -> str:
+        return os.path.join(self.disk_path, key + ".json")
+
+    def _disk_get(self, key: str) -> tuple:
+        if self.disk_path is None:
+            return None, MISSING
+        try:
+            with open(self._disk_file(key), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None, MISSING
+        if self._expired(entry["time"]):
+            self._disk_remove(self._disk_file(key))
+            return None, MISSING
+        return entry["time"], entry["result"]
+
+    @staticmethod
+    def _disk_remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            # Already removed by another worker.
+            pass
+
+    def _disk_put(self, key: str, created_at: float, result: object) -> None:
+        if self.disk_path is None:
+            return
+        # Write to a temporary file first so other workers never read a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({"time": created_at, "result": result}, f)
+            os.replace(tmp_path, self._disk_file(key))
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Failed to write disk cache entry: %s", str(e))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        if self.disk_size is None:
+            return
+        # Listing the directory is costly, so it is only trimmed every disk_size / 10 writes.
+        with self._lock:
+            self._disk_writes += 1
+            if self._disk_writes < max(1, self.disk_size // 10):
+                return
+            self._disk_writes = 0
+        self._disk_trim()
+
+    def _disk_trim(self) -> None:
+        """
+        Remove the oldest files of the disk tier until at most `disk_size` are left.
+        """
+        files = []
+        with os.scandir(self.disk_path) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+        if len(files) <= self.disk_size:
+            return
+        files.sort()
+        for _, path in files[:len(files) - self.disk_size]:
+            self._disk_remove(path)
+
+
+class CachedCall:
+    """
+    Result cache handling of one tool call, shared by the addon servers: key, lookup, metrics and X-Cache header.
+    """
+
+    def __init__(self, cache: ResultCache, name: str, data: object, metrics=None):
+        """
+        Prepare the call.
+        :param cache: cache of the tool, or None if it has none.
+        :param name: external name of the tool.
+        :param data: decoded json payload.
+        :param metrics: if not None, ServerMetrics recording the lookup.
+        """
+        self.cache = cache
+        self.name = name
+        self.metrics = metrics
+        self.key = ResultCache.make_key(name, data) if cache is not None else None
+        self.status = None
+        """
+        HIT | MISS once looked up, None without cache.
+        """
+
+    @property
+    def uses_disk(self) -> bool:
+        """
+        Whether `lookup()` and `store()` may read or write files.
+        """
+        return self.cache is not None and self.cache.disk_path is not None
+
+    def lookup(self) -> object:
+        """
+        Look up the cached result.
+        :return: cached result, or MISSING if there is none (always without cache).
+        """
+        if self.cache is None:
+            return MISSING
+        result = self.cache.get(self.key)
+        self.status = "MISS" if result is MISSING else "HIT"
+        if self.metrics is not None:
+            self.metrics.cache_lookup(self.name, hit=self.status == "HIT")
+        return result
+
+    def store(self, result: object) -> None:
+        """
+        Store the result computed by the tool, if the tool has a cache.
+        :param result: json-serializable result.
+        :return: None.
+        """
+        if self.cache is not None:
+            self.cache.put(self.key, result)
+
+    @property
+    def headers(self) -> dict:
+        """
+        Extra response headers telling whether the cache was hit.
+        """
+        return {"X-Cache": self.status} if self.status is not None else {}
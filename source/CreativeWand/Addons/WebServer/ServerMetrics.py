@@ -0,0 +1,160 @@
+"""
+ServerMetrics.py
+
+This file contains a small metrics registry for the addon server,
+which can be rendered in Prometheus text exposition format.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+from collections import defaultdict
+
+# Default histogram buckets.
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+size_buckets = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Common prefix for every exported metric.
+metric_prefix = "creativewand_addon_"
+
+
+class Histogram:
+    """
+    A cumulative histogram with fixed buckets.
+    """
+
+    def __init__(self, buckets: tuple):
+        """
+        Initialize a histogram.
+        :param buckets: (tuple) sorted upper bounds of the buckets, without +Inf.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """
+        Record one observation.
+        :param value: observed value.
+        :return: None.
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list:
+        """
+        Render this histogram as Prometheus sample lines.
+        :param name: full metric name.
+        :param labels: rendered label pairs (without braces) shared by all samples.
+        :return: list of lines.
+        """
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append('%s_bucket{%s,le="%s"} %s' % (name, labels, bound, cumulative))
+        lines.append('%s_sum{%s} %s' % (name, labels, self.sum))
+        lines.append('%s_count{%s} %s' % (name, labels, self.count))
+        return lines
+
+
+class ServerMetrics:
+    """
+    Per-tool request metrics of the addon server. All methods are thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)
+        """
+        Finished requests, keyed by (tool, status code).
+        """
+        self.errors = defaultdict(int)
+        self.in_flight = defaultdict(int)
+        self.latency = defaultdict(lambda: Histogram(latency_buckets))
+        self.request_size = defaultdict(lambda: Histogram(size_buckets))
+        self.response_size = defaultdict(lambda: Histogram(size_buckets))
+        self.cache = defaultdict(int)
+        """
+        Cache lookups, keyed by (tool, "hit" | "miss").
+        """
+
+    def request_started(self, tool: str, payload_size: int) -> None:
+        """
+        Record the start of a request.
+        :param tool: external name of the tool.
+        :param payload_size: size of the request body in bytes.
+        :return: None.
+        """
+        with self._lock:
+            self.in_flight[tool] += 1
+            self.request_size[tool].observe(payload_size)
+
+    def request_finished(self, tool: str, status: int, duration: float, response_size: int = None) -> None:
+        """
+        Record the end of a request.
+        :param tool: external name of the tool.
+        :param status: http status code returned.
+        :param duration: seconds spent handling the request.
+        :param response_size: size of the response body in bytes, or None if there is none.
+        :return: None.
+        """
+        with self._lock:
+            self.in_flight[tool] -= 1
+            self.requests[(tool, status)] += 1
+            self.latency[tool].observe(duration)
+            if response_size is not None:
+                self.response_size[tool].observe(response_size)
+            if status >= 500:
+                self.errors[tool] += 1
+
+    def cache_lookup(self, tool: str, hit: bool) -> None:
+        """
+        Record a result cache lookup.
+        :param tool: external name of the tool.
+        :param hit: whether the lookup was a hit.
+        :return: None.
+        """
+        with self._lock:
+            self.cache[(tool, "hit" if hit else "miss")] += 1
+
+    def render(self) -> str:
+        """
+        Render all metrics in Prometheus text exposition format.
+        :return: metrics text.
+        """
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append("# HELP %s%s %s" % (metric_prefix, name, help_text))
+            lines.append("# TYPE %s%s %s" % (metric_prefix, name, kind))
+
+        with self._lock:
+            header("requests_total", "counter", "Requests handled, by tool and status code.")
+            for (tool, status), value in sorted(self.requests.items()):
+                lines.append('%srequests_total{tool="%s",status="%s"} %s' % (metric_prefix, tool, status, value))
+
+            header("request_errors_total", "counter", "Requests that failed inside the tool.")
+            for tool, value in sorted(self.errors.items()):
+                lines.append('%srequest_errors_total{tool="%s"} %s' % (metric_prefix, tool, value))
+
+            header("requests_in_flight", "gauge", "Requests currently being handled.")
+            for tool, value in sorted(self.in_flight.items()):
+                lines.append('%srequests_in_flight{tool="%s"} %s' % (metric_prefix, tool, value))
+
+            for name, histograms, help_text in (
+                    ("request_duration_seconds", self.latency, "Time spent handling requests."),
+                    ("request_size_bytes", self.request_size, "Size of request payloads."),
+                    ("response_size_bytes", self.response_size, "Size of response payloads."),
+            ):
+                header(name, "histogram", help_text)
+                for tool, histogram in sorted(histograms.items()):
+                    lines += histogram.render(metric_prefix + name, 'tool="%s"' % tool)
+
+            header("cache_lookups_total", "counter", "Result cache lookups, by tool and result.")
+            for (tool, result), value in sorted(self.cache.items()):
+                lines.append('%scache_lookups_total{tool="%s",result="%s"} %s' % (metric_prefix, tool, result, value))
+
+        return "\n".join(lines) + "\n"
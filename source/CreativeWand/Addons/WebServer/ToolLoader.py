@@ -0,0 +1,287 @@
+"""
+ToolLoader.py
+
+This file contains the tool registry used by addon servers to load the tools
+described in `tool_config` (see `AddonConfig.py`), either eagerly, in the background
+or lazily on their first call.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import threading
+from importlib import import_module
+
+from CreativeWand.Addons.WebServer.ResultCache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+# Common class prefix appended to every tool definition to find them
+# In Addons/Toolbox folder.
+tool_common_prefix = "CreativeWand.Addons.Toolbox."
+
+# Supported loading modes.
+load_modes = ["eager", "background", "lazy"]
+
+# Loading status of a tool.
+STATUS_PENDING = "pending"
+STATUS_LOADING = "loading"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+def is_async_tool(tool_object: object) -> bool:
+    """
+    Whether calling a tool returns an awaitable.
+    :param tool_object: tool (or plain function).
+    :return: True if the tool defines `async __call__()` or is a coroutine function itself.
+    """
+    if inspect.iscoroutinefunction(tool_object):
+        return True
+    return inspect.iscoroutinefunction(getattr(tool_object, "__call__", None))
+
+
+class ToolRegistry:
+    """
+    Holds tool definitions and the loaded tool objects of an addon server.
+    """
+
+    def __init__(self, load_mode: str = "eager"):
+        """
+        Initialize an empty registry.
+        :param load_mode: (str) eager | background | lazy:
+            eager - load every tool in `load_all()` before serving;
+            background - load every tool in a background thread while serving;
+            lazy - load a tool when it is first called.
+        """
+        self.load_mode = None
+        self.set_load_mode(load_mode)
+        self.specs = {}
+        """
+        Tool definitions, keyed by external name.
+        """
+        self.tools = {}
+        """
+        Loaded tools, keyed by external name. Each entry has "object", "func" and "cache".
+        """
+        self.status = {}
+        """
+        Loading status of every registered tool, keyed by external name.
+        """
+        self._locks = {}
+        self._warming = {}
+        """
+        Loaded tools waiting for their async warmup, keyed by external name.
+        """
+        self.async_warmup_handler = None
+        """
+        If not None, function (name, warmup) called from `load()` when a tool has an async warmup hook or
+        is async itself; `warmup` is a coroutine to run on the event loop serving the tool
+        (so that clients the tool creates are bound to that loop). Without a handler, such tools fail to load.
+        """
+
+    def set_load_mode(self, load_mode: str) -> None:
+        """
+        Change the load mode. Should be called before `start()`.
+        :param load_mode: (str) eager | background | lazy.
+        :return: None.
+        """
+        if load_mode not in load_modes:
+            raise ValueError("Unknown load mode %s. Supported: %s" % (load_mode, load_modes))
+        self.load_mode = load_mode
+
+    def register(self, tool_config: dict, tools_to_enable: list = None) -> None:
+        """
+        Register tool definitions without loading them.
+        :param tool_config: (dict) tool config dictionary, see `run_addon_server()`.
+        :param tools_to_enable: (list) if not None, will ignore any tool in `tool_config` that is not in it.
+        :return: None.
+        """
+        for k, v in tool_config.items():
+
+            # If "external-name" is set in tool config, use that name instead. Otherwise use entry name.
+            tool_external_name = v['external-name'] if 'external-name' in v else k
+
+            if tools_to_enable is not None and k not in tools_to_enable:
+                logger.info("Skipping loading tool %s.", k)
+                continue
+
+            if 'func' in v and v['func'] is not None:
+                logger.warning("funcname is not supported yet. Only __call__() will be used.")
+
+            if tool_external_name in self.specs:
+                raise AttributeError(
+                    "Trying to create two services with the same external name: %s !" % tool_external_name)
+            self.specs[tool_external_name] = v
+            self.status[tool_external_name] = STATUS_PENDING
+            self._locks[tool_external_name] = threading.Lock()
+
+    def load(self, name: str) -> dict:
+        """
+        Load a registered tool and run its warmup, if not loaded yet. Thread-safe.
+        An async warmup is handed to `async_warmup_handler`, and the tool is ready once it finished.
+        :param name: external name of the tool.
+        :return: loaded tool entry, or None if it waits for its async warmup.
+        """
+        with self._locks[name]:
+            if name in self.tools:
+                return self.tools[name]
+            if name in self._warming:
+                return None
+            self.status[name] = STATUS_LOADING
+            try:
+                entry = self._create(self.specs[name])
+                tool_object = entry["object"]
+                samples = self.specs[name].get('warmup', None)
+                if inspect.iscoroutinefunction(getattr(tool_object, "warmup", None)) or is_async_tool(tool_object):
+                    if self.async_warmup_handler is None:
+                        raise RuntimeError("Tool %s is async and needs to be served by the async addon server."
+                                           % name)
+                    self._warming[name] = entry
+                    self.async_warmup_handler(name, self._warm_up_async(name, tool_object, samples))
+                    return None
+                self._warm_up(name, tool_object, samples)
+            except Exception:
+                self._warming.pop(name, None)
+                self.status[name] = STATUS_FAILED
+                raise
+            self._set_ready(name, entry)
+            return entry
+
+    def _set_ready(self, name: str, entry: dict) -> None:
+        self.tools[name] = entry
+        self.status[name] = STATUS_READY
+        logger.info("Tool %s is ready.", name)
+
+    def load_all(self, raise_errors: bool = True) -> None:
+        """
+        Load every registered tool.
+        :param raise_errors: if False, log loading errors and keep loading other tools.
+        :return: None.
+        """
+        for name in self.specs:
+            try:
+                self.load(name)
+            except Exception:
+                if raise_errors:
+                    raise
+                logger.exception("Failed to load tool %s.", name)
+        logger.info("Loaded tool objects: %s", self.tools)
+
+    def start(self) -> None:
+        """
+        Start loading tools according to the load mode.
+        :return: None.
+        """
+        if self.load_mode == "eager":
+            self.load_all()
+        elif self.load_mode == "background":
+            threading.Thread(target=self.load_all, kwargs={"raise_errors": False}, daemon=True).start()
+
+    def get(self, name: str) -> dict:
+        """
+        Get a loaded tool, loading it now if running in lazy mode.
+        :param name: external name of the tool.
+        :return: loaded tool entry, or None if it is not loaded (yet).
+        """
+        if name in self.tools:
+            return self.tools[name]
+        if self.load_mode == "lazy":
+            return self.load(name)
+        return None
+
+    def is_ready(self) -> bool:
+        """
+        Whether every registered tool is loaded.
+        In lazy mode, tools not loaded yet are counted as ready since they load on their first call.
+        :return: True if the server can handle requests for every tool.
+        """
+        accepted = [STATUS_READY, STATUS_PENDING] if self.load_mode == "lazy" else [STATUS_READY]
+        return all(status in accepted for status in self.status.values())
+
+    @staticmethod
+    def _create(spec: dict) -> dict:
+        """
+        Create a tool entry from its definition.
+        :param spec: tool definition in `tool_config`.
+        :return: tool entry.
+        """
+        filename = spec['file'] if 'file' in spec else None
+        classname = spec['class']
+        config = spec['config'] if 'config' in spec else None
+
+        if inspect.isclass(classname):
+            tool_class = classname
+        elif type(classname) is str:
+            # Creating using str - Will only work with specific dir structure, deprecated
+            python_filepath = tool_common_prefix + filename
+            module = import_module(python_filepath)
+            tool_class = getattr(module, classname)
+        else:
+            raise AttributeError("classname not a str or class: %s" % classname)
+
+        if config:
+            tool_object = tool_class(config)
+        else:
+            tool_object = tool_class()
+        return {
+            "object": tool_object,
+            "func": spec['func'] if 'func' in spec else None,
+            "cache": ResultCache.from_config(spec['cache']) if spec.get('cache') else None,
+        }
+
+    @staticmethod
+    def _warm_up(name: str, tool_object: object, samples: list = None) -> None:
+        """
+        Warm a tool up before it is marked ready.
+        Calls the optional `warmup()` hook of the tool; if it returns a list, each item is used as a
+        sample payload and sent to `__call__()`, as are the payloads in the "warmup" entry of the tool config.
+        :param name: external name of the tool.
+        :param tool_object: tool to warm up.
+        :param samples: (list) sample payloads from tool config.
+        :return: None.
+        """
+        payloads = list(samples) if samples else []
+        hook = getattr(tool_object, "warmup", None)
+        if callable(hook):
+            returned = hook()
+            if isinstance(returned, list):
+                payloads += returned
+        for payload in payloads:
+            tool_object(payload)
+        if payloads:
+            logger.info("Warmed up tool %s with %s sample payloads.", name, len(payloads))
+
+    async def _warm_up_async(self, name: str, tool_object: object, samples: list = None) -> dict:
+        """
+        Same as `_warm_up()` for tools with an async hook or `__call__()`, then mark the tool ready.
+        Sync parts run in the default executor of the loop.
+        :return: loaded tool entry.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            payloads = list(samples) if samples else []
+            hook = getattr(tool_object, "warmup", None)
+            if callable(hook):
+                returned = hook() if inspect.iscoroutinefunction(hook) else await loop.run_in_executor(None, hook)
+                if inspect.isawaitable(returned):
+                    returned = await returned
+                if isinstance(returned, list):
+                    payloads += returned
+            for payload in payloads:
+                if is_async_tool(tool_object):
+                    await tool_object(payload)
+                else:
+                    await loop.run_in_executor(None, tool_object, payload)
+            if payloads:
+                logger.info("Warmed up tool %s with %s sample payloads.", name, len(payloads))
+        except BaseException:
+            with self._locks[name]:
+                self._warming.pop(name, None)
+                self.status[name] = STATUS_FAILED
+            raise
+        with self._locks[name]:
+            entry = self._warming.pop(name)
+            self._set_ready(name, entry)
+        return entry
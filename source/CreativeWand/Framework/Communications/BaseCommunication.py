@@ -21,6 +21,20 @@ class BaseCommunication(ABC):
     # region static
     tag = []
 
+    depends_on = None
+    """
+    State keys `confidence_to_activate()` depends on, looked up in both the experience manager
+    and the creative context states. If set, CommunicationGroupManager caches the confidence and
+    only recomputes it when one of these values changes; [] means it never changes.
+    None (default) means it is recomputed every time.
+    """
+
+    confidence_timeout = None
+    """
+    Max seconds to wait for this communication's confidences when CommunicationGroupManager
+    evaluates them in parallel; a later result counts as 0. None uses the manager's default.
+    """
+
     # endregion
 
     def __init__(self, description="", info: dict = None):
@@ -0,0 +1,40 @@
+"""
+BaseCommunicationFamily.py
+
+This file contains the base class BaseCommunicationFamily, a group of communications
+whose confidences are computed together in one vectorized call.
+"""
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+
+from CreativeWand.Framework.Communications.BaseCommunication import BaseCommunication
+
+
+class BaseCommunicationFamily(ABC):
+    """
+    A group of communications (e.g. parameterized variants of one tool) scored in batch.
+    Register it with `CommunicationGroupManager.bind_communication_family()`.
+    """
+
+    def __init__(self, members: List[BaseCommunication]):
+        """
+        Initialize a family.
+        :param members: communications of this family; each is registered as a regular communication too.
+        """
+        self.members = list(members)
+        """
+        Communications of this family, in the order of `confidences()`.
+        """
+
+    @abstractmethod
+    def confidences(self, context_features: object = None) -> np.ndarray:
+        """
+        Activation confidences of all members at once.
+        :param context_features: features of the current context given by the caller
+            (e.g. the RL observation), or None.
+        :return: array of shape (len(members),), numbers from 0 to 1 in the order of `members`.
+        """
+        pass
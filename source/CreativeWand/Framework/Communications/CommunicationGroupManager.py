@@ -5,9 +5,18 @@ This file describes a manager that manages all communications available to exter
 """
 from __future__ import annotations
 
+import heapq
 import operator
+import threading
+import time
+from concurrent.futures import Executor, TimeoutError
+from copy import deepcopy
+
+import numpy as np
 
 from CreativeWand.Framework.Communications.BaseCommunication import BaseCommunication
+from CreativeWand.Framework.Communications.BaseCommunicationFamily import BaseCommunicationFamily
+from CreativeWand.Utils.Misc.Equality import values_equal
 
 # Fix circular import on type hints.
 from typing import TYPE_CHECKING, List
@@ -24,6 +33,34 @@ class CommunicationGroupManager:
     def __init__(self):
         self._communications = []
         self._exp_manager = None
+        self._communications_by_tag = {}
+        """
+        Index of registered communications, as tag -> list of comms in registration order.
+        """
+        self._registration_order = {}
+        self._families = []
+        """
+        Registered families, as (family, registration indices of its members).
+        """
+        self._individual_indices = []
+        """
+        Registration indices of communications not in any family.
+        """
+        self._confidence_cache = {}
+        """
+        Cached activation confidences of communications declaring `depends_on`,
+        as comm -> (values of the dependencies, confidence).
+        """
+        self.confidence_cache_hits = 0
+        self.confidence_cache_misses = 0
+        self._executor = None
+        self._default_timeout = None
+        self._timings = {}
+        """
+        Timing statistics of confidence evaluations done with the executor,
+        as (comm, whether it is an interrupt confidence) -> dict.
+        """
+        self._timings_lock = threading.Lock()
 
     def bind_experience_manager(self, exp_manager: BaseExperienceManager) -> None:
         """
@@ -47,19 +84,85 @@ class CommunicationGroupManager:
         :return:
         """
         comm.register_manager(self)
+        self._registration_order[comm] = len(self._communications)
+        self._individual_indices.append(len(self._communications))
         self._communications.append(comm)
+        for tag in comm.tag:
+            self._communications_by_tag.setdefault(tag, []).append(comm)
+
+    def bind_communication_family(self, family: BaseCommunicationFamily) -> None:
+        """
+        Register every member of a family, so that `get_confidence_vector()` scores them
+        with one `family.confidences()` call.
+        :param family: family to register.
+        :return:
+        """
+        indices = []
+        for comm in family.members:
+            self.bind_communication(comm)
+            indices.append(self._individual_indices.pop())
+        self._families.append((family, np.array(indices, dtype=np.int64)))
 
-    def get_available_communications(self, threshold=0.5, sort_by="confidence") -> list:
+    def get_confidence_vector(self, context_features: object = None) -> np.ndarray:
+        """
+        Activation confidences of all registered communications as one vector, e.g. to be used
+        as an action mask (`vector > threshold`) or prior by RL experience managers.
+        Families are scored in batch, other communications one by one (through the `depends_on` cache).
+        :param context_features: passed to `confidences()` of every family.
+        :return: float32 array of shape (len(get_all_communications()),), in registration order.
+        """
+        result = np.empty(len(self._communications), dtype=np.float32)
+        for family, indices in self._families:
+            confidences = np.asarray(family.confidences(context_features), dtype=np.float32)
+            if confidences.shape != indices.shape:
+                raise ValueError("%s returned confidences of shape %s, expected %s."
+                                 % (type(family).__name__, confidences.shape, indices.shape))
+            result[indices] = confidences
+        if self._individual_indices:
+            comms = [self._communications[i] for i in self._individual_indices]
+            result[self._individual_indices] = [confidence for _, confidence in self._evaluate_confidences(comms)]
+        return result
+
+    def get_communications_by_tags(self, tags=None) -> List[BaseCommunication]:
+        """
+        Return registered communications having any of the tags, using the tag index.
+        :param tags: (str or list) tag(s) to look for, or None for all communications.
+        :return: list of communications, in registration order.
+        """
+        if tags is None:
+            return self._communications
+        if isinstance(tags, str):
+            tags = [tags]
+        if len(tags) == 1:
+            return list(self._communications_by_tag.get(tags[0], []))
+        selected = set()
+        for tag in tags:
+            selected.update(self._communications_by_tag.get(tag, []))
+        return sorted(selected, key=self._registration_order.__getitem__)
+
+    def set_executor(self, executor: Executor = None, timeout: float = None) -> None:
+        """
+        Evaluate confidences of communications in parallel, e.g. when some of them call models or remote tools.
+        :param executor: executor to submit evaluations to (e.g. a ThreadPoolExecutor), or None to evaluate serially.
+        :param timeout: (float) default max seconds to wait for a confidence, counted from when the evaluation
+            of all communications started; later results are treated as 0. Communications can override it with
+            their `confidence_timeout`. None to wait as long as needed.
+        :return: None.
+        """
+        self._executor = executor
+        self._default_timeout = timeout
+
+    def get_available_communications(self, threshold=0.5, sort_by="confidence", tags=None) -> list:
         """
         Return a list of available communications.
         :param threshold: The threshold of determining how much confidence is needed to be included.
         :param sort_by: confidence | description: The criteria for sorting the communications.
+        :param tags: (str or list) if not None, only communications having any of these tags are evaluated.
         :return: list of available communications at this context.
         """
 
         comms_by_sort_key = {}
-        for comm in self._communications:
-            confidence = comm.confidence_to_activate()
+        for comm, confidence in self._evaluate_confidences(self.get_communications_by_tags(tags)):
             description = comm.description
             if confidence > threshold:
                 if sort_by == "confidence":
@@ -75,6 +178,140 @@ class CommunicationGroupManager:
 
         return sorted_cbc
 
+    def get_confidence_to_activate(self, comm: BaseCommunication) -> float:
+        """
+        Get `comm.confidence_to_activate()`, reusing the last value if none of the state keys
+        in `comm.depends_on` changed since. Communications without `depends_on` are always recomputed.
+        :param comm: communication.
+        :return: activation confidence.
+        """
+        return next(self._evaluate_confidences([comm]))[1]
+
+    def _evaluate_confidences(self, comms: list, interrupt: bool = False):
+        """
+        Evaluate confidences of communications, serially or with the executor (see `set_executor()`).
+        Activation confidences go through the `depends_on` cache.
+        :param comms: communications to evaluate.
+        :param interrupt: if True, evaluate `confidence_to_interrupt_activate()` instead of `confidence_to_activate()`.
+        :return: generator of (comm, confidence), in the order of `comms`.
+            When evaluating serially, a communication is only evaluated when the generator reaches it.
+        """
+        # (comm, dependency values or None, cached confidence or None)
+        entries = []
+        for comm in comms:
+            dependencies, cached_confidence = None, None
+            if not interrupt and comm.depends_on is not None:
+                dependencies = self._get_dependency_values(comm.depends_on)
+                cached = self._confidence_cache.get(comm)
+                if cached is not None and values_equal(cached[0], dependencies):
+                    self.confidence_cache_hits += 1
+                    cached_confidence = cached[1]
+                else:
+                    self.confidence_cache_misses += 1
+            entries.append((comm, dependencies, cached_confidence))
+
+        futures = {}
+        start_time = time.perf_counter()
+        if self._executor is not None:
+            for comm, _, cached_confidence in entries:
+                if cached_confidence is None:
+                    futures[comm] = self._executor.submit(self._timed_confidence, comm, interrupt)
+
+        for comm, dependencies, confidence in entries:
+            if confidence is None:
+                if comm in futures:
+                    confidence = self._wait_confidence(comm, interrupt, futures[comm], start_time)
+                else:
+                    confidence = self._compute_confidence(comm, interrupt)
+                if dependencies is not None and confidence is not None:
+                    # Copied so that values changed in place are detected too.
+                    self._confidence_cache[comm] = (deepcopy(dependencies), confidence)
+            yield comm, confidence if confidence is not None else 0.0
+
+    @staticmethod
+    def _compute_confidence(comm: BaseCommunication, interrupt: bool) -> float:
+        return comm.confidence_to_interrupt_activate() if interrupt else comm.confidence_to_activate()
+
+    def _timed_confidence(self, comm: BaseCommunication, interrupt: bool) -> tuple:
+        """
+        Evaluate one confidence in the executor and record how long it took.
+        :return: (confidence, time it was obtained).
+        """
+        start_time = time.perf_counter()
+        confidence = self._compute_confidence(comm, interrupt)
+        end_time = time.perf_counter()
+        with self._timings_lock:
+            timing = self._timing_entry(comm, interrupt)
+            timing["calls"] += 1
+            timing["total_time"] += end_time - start_time
+            timing["max_time"] = max(timing["max_time"], end_time - start_time)
+        return confidence, end_time
+
+    def _wait_confidence(self, comm: BaseCommunication, interrupt: bool, future, start_time: float) -> float:
+        """
+        Wait for a confidence submitted to the executor.
+        :return: confidence, or None if it timed out.
+        """
+        timeout = comm.confidence_timeout if comm.confidence_timeout is not None else self._default_timeout
+        if timeout is None:
+            return future.result()[0]
+        deadline = start_time + timeout
+        try:
+            confidence, end_time = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+            # It may have finished late while waiting for other communications.
+            if end_time <= deadline:
+                return confidence
+        except TimeoutError:
+            pass
+        with self._timings_lock:
+            self._timing_entry(comm, interrupt)["timeouts"] += 1
+        return None
+
+    def _timing_entry(self, comm: BaseCommunication, interrupt: bool) -> dict:
+        key = (comm, interrupt)
+        if key not in self._timings:
+            self._timings[key] = {"calls": 0, "total_time": 0.0, "max_time": 0.0, "timeouts": 0}
+        return self._timings[key]
+
+    def get_confidence_timings(self) -> dict:
+        """
+        Timing statistics of confidence evaluations done with the executor so far (see `set_executor()`);
+        serial evaluations are not timed.
+        :return: dict of (comm, interrupt) -> {"calls", "total_time", "mean_time", "max_time", "timeouts"},
+            where interrupt is True for `confidence_to_interrupt_activate()`; times in seconds.
+        """
+        with self._timings_lock:
+            return {
+                key: dict(timing, mean_time=timing["total_time"] / timing["calls"] if timing["calls"] > 0 else 0.0)
+                for key, timing in self._timings.items()
+            }
+
+    def _get_dependency_values(self, keys: list) -> list:
+        """
+        Current values of state keys, from the experience manager and creative context states.
+        :param keys: state keys.
+        :return: list of (manager value, context value).
+        """
+        exp_manager = self._exp_manager
+        creative_context = getattr(exp_manager, "creative_context", None)
+        return [
+            (exp_manager.get_state(key) if exp_manager is not None else None,
+             creative_context.get_state(key) if creative_context is not None else None)
+            for key in keys
+        ]
+
+    def invalidate_confidences(self, comm: BaseCommunication = None) -> None:
+        """
+        Drop cached activation confidences, e.g. when a communication changed in a way
+        not covered by its `depends_on`.
+        :param comm: communication to invalidate, or None for all of them.
+        :return: None.
+        """
+        if comm is None:
+            self._confidence_cache.clear()
+        else:
+            self._confidence_cache.pop(comm, None)
+
     def get_all_communications(self) -> List[BaseCommunication]:
         """
         Return a list of all communications whether they are available.
@@ -82,24 +319,44 @@ class CommunicationGroupManager:
         """
         return self._communications
 
-    def get_interrupt_communications(self, threshold=0.5) -> list:
+    def get_interrupt_communications(self, threshold=0.5, tags=None) -> list:
         """
         Return a list of available communications that wish to interrupt.
         :param threshold: The threshold of determining how much confidence is needed to be included.
+        :param tags: (str or list) if not None, only communications having any of these tags are evaluated.
         :return: list of available communications that wants to interrupt at this context.
         """
-        comms_by_confidence = {}
-        for comm in self._communications:
-            confidence = comm.confidence_to_interrupt_activate()
-            if confidence > threshold:
-                comms_by_confidence[comm] = confidence
-        # Sort comms by confidence
-        sorted_cbc = sorted(comms_by_confidence.items(), key=operator.itemgetter(1), reverse=True)
+        return self.top_k_interrupts(len(self._communications), threshold=threshold, early_exit=False, tags=tags)
 
-        # Then only take the comms
-        sorted_cbc = list(x[0] for x in sorted_cbc)
-
-        return sorted_cbc
+    def top_k_interrupts(self, k=1, threshold=0.5, early_exit=True, tags=None) -> list:
+        """
+        Return the k communications that most wish to interrupt, without sorting all of them.
+        Ties are broken by registration order.
+        :param k: max number of communications to return.
+        :param threshold: The threshold of determining how much confidence is needed to be included.
+        :param early_exit: if True, stop evaluating once k communications reported confidence 1.0 (the max).
+        :param tags: (str or list) if not None, only communications having any of these tags are evaluated.
+        :return: list of at most k communications, by decreasing confidence.
+        """
+        if k <= 0:
+            return []
+        # Min-heap of (confidence, -registration order, comm) holding the best k so far.
+        heap = []
+        n_max_confidence = 0
+        evaluations = self._evaluate_confidences(self.get_communications_by_tags(tags), interrupt=True)
+        for order, (comm, confidence) in enumerate(evaluations):
+            if confidence <= threshold:
+                continue
+            entry = (confidence, -order, comm)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+            if confidence >= 1.0:
+                n_max_confidence += 1
+                if early_exit and n_max_confidence >= k:
+                    break
+        return [entry[2] for entry in sorted(heap, key=lambda e: e[:2], reverse=True)]
 
     def suppress_all_interrupts(self) -> bool:
         """
@@ -12,8 +12,10 @@ import gym
 import numpy as np
 from gym import spaces
 
+from CreativeWand.Framework.Communications.BaseCommunication import BaseCommunication
 from CreativeWand.Framework.CreativeContext.BaseCreativeContext import BaseCreativeContext
 from CreativeWand.Framework.ExperienceManager.BaseExperienceManager import BaseExperienceManager
+from CreativeWand.Framework.ExperienceManager.ObservationBuffer import ObservationBuffer, ObservationSpec
 from CreativeWand.Framework.Frontend.BaseFrontEnd import BaseFrontend
 
 
@@ -41,6 +43,20 @@ class BaseRLExperienceManager(BaseExperienceManager, ABC):
         self.rl_agent_info = rl_agent_info
         self.rl_agent_mode = rl_agent_mode
 
+        self._action_list = None
+        """
+        Cached action table of the reference `_get_action_list()`.
+        """
+        self._action_list_n_comms = 0
+        """
+        Number of communications registered when `_action_list` was built.
+        """
+
+        self._observation_buffer = None
+        """
+        Observation buffer following `_get_observation_spec()`, created on first use.
+        """
+
     # region RL setup
 
     """
@@ -62,11 +78,76 @@ class BaseRLExperienceManager(BaseExperienceManager, ABC):
         Get a list of actions. This is also used to determine the dimension of action space.
         This implementation assumes each communication get one and only one entry; This can be customized
         in inherited classes.
+        The list is built once and reused until more communications are registered.
         :return: list of actions.
         """
-        result = self.comm_group_manager.get_all_communications()
-        result.append("Dummy_EndSession")  # hack to allow session ending actions.
-        return result
+        communications = self.comm_group_manager.get_all_communications()
+        if self._action_list is None or self._action_list_n_comms != len(communications):
+            # Copied, as appending to the manager's own list would register the dummy action.
+            self._action_list = list(communications)
+            self._action_list.append("Dummy_EndSession")  # hack to allow session ending actions.
+            self._action_list_n_comms = len(communications)
+        return self._action_list
+
+    def action_mask(self) -> np.array:
+        """
+        Which actions of `_get_action_list()` can be taken now, so that agents can skip invalid actions.
+        Communications are checked with `can_activate()`; other actions (e.g. "Dummy_EndSession") are always valid.
+        :return: bool array of shape (number of actions,).
+        """
+        return np.array([action.can_activate() if isinstance(action, BaseCommunication) else True
+                         for action in self._get_action_list()], dtype=bool)
+
+    def _get_action_confidences(self, context_features: object = None) -> np.array:
+        """
+        Confidences of all actions in one vector, to be used as an action mask or prior.
+        This reference implementation matches the default `_get_action_list()`: confidences of all
+        communications (see `CommunicationGroupManager.get_confidence_vector()`), then 1 for "Dummy_EndSession".
+        :param context_features: passed to communication families, e.g. the current observation.
+        :return: float32 array of shape (number of actions,).
+        """
+        return np.append(self.comm_group_manager.get_confidence_vector(context_features),
+                         np.float32(1.0)).astype(np.float32, copy=False)
+
+    def _get_observation_spec(self) -> Union[ObservationSpec, None]:
+        """
+        Declare the layout of observations, so that they are kept in a preallocated buffer
+        and only slices whose state keys changed are recomputed (see `_update_observation()`).
+        :return: observation spec, or None if observations are built by `_get_current_observation()` alone.
+        """
+        return None
+
+    def _get_observation_state(self, key: str) -> object:
+        """
+        Value of a state key used by observation fields: the experience manager state,
+        or the creative context state if the manager does not have that key.
+        :param key: state key.
+        :return: state value, or None.
+        """
+        value = self.get_state(key)
+        if value is None and getattr(self, "creative_context", None) is not None:
+            value = self.creative_context.get_state(key)
+        return value
+
+    def _update_observation(self) -> np.array:
+        """
+        Update the observation buffer from the current state; `_get_current_observation()`
+        can simply return this when `_get_observation_spec()` is implemented.
+        :return: read-only view of the buffer, copy it to keep it past the next step.
+        """
+        if self._observation_buffer is None:
+            self._observation_buffer = ObservationBuffer(self._get_observation_spec())
+        return self._observation_buffer.update(self._get_observation_state)
+
+    def _get_observation_shape(self) -> tuple:
+        """
+        Shape of observations, from the spec if declared (so no observation is built just to read it).
+        :return: observation shape.
+        """
+        spec = self._get_observation_spec()
+        if spec is not None:
+            return spec.shape
+        return self._get_current_observation().shape
 
     @abstractmethod
     def _get_current_observation(self, and_then_render=False) -> np.array:
@@ -99,11 +180,27 @@ class BaseRLExperienceManager(BaseExperienceManager, ABC):
         """
         list_of_actions = self._get_action_list()
         if idx == len(list_of_actions) - 1:  # last action, is EndSession
-            return self._get_current_observation(), self._get_reward_by_last_action(), True, self._get_info()
+            return self._get_current_observation(), self._get_reward_by_last_action(), True, self._get_step_info()
         else:
             # Execute actions
-            action_result = self.comm_group_manager.get_all_communications()[idx].activate()
-            return self._get_current_observation(), self._get_reward_by_last_action(), False, self._get_info()
+            action_result = list_of_actions[idx].activate()
+            return self._get_current_observation(), self._get_reward_by_last_action(), False, self._get_step_info()
+
+    def _get_step_info(self) -> dict:
+        """
+        Info returned by gym env steps: `_get_info()` plus the "action_mask" for the next step.
+        :return: info for gym environment.
+        """
+        info = dict(self._get_info())
+        info["action_mask"] = self.action_mask()
+        return info
+
+    def _get_reset_info(self) -> dict:
+        """
+        Info returned by gym env resets: the "action_mask" for the first step.
+        :return: info for gym environment.
+        """
+        return {"action_mask": self.action_mask()}
 
     @abstractmethod
     def _get_reward_by_last_action(self) -> float:
@@ -132,29 +229,40 @@ class BaseRLExperienceManager(BaseExperienceManager, ABC):
         save it to self.env .
         :return: created env object.
         """
+        self.env = CreativeWandWrappedEnv(self)
+        return self.env
 
-        # save a copy of the reference as self is going to be shadowed
-        outer_self = self
+    # endregion
 
-        class CreativeWandWrappedEnv(gym.Env):
-            def reset(self):
-                outer_self._reset()
 
-            def render(self, mode="human"):
-                outer_self._get_current_observation(and_then_render=True)
+class CreativeWandWrappedEnv(gym.Env):
+    """
+    A gym environment driving a BaseRLExperienceManager, following the gym >= 0.26 API:
+    `reset()` returns (obs, info) and `step()` returns (obs, reward, terminated, truncated, info).
+    The (obs, reward, done, info) of `_execute_action_with_idx()` is reported as terminated=done, truncated=False.
+    """
 
-            def step(self, action):
-                outer_self._execute_action_with_idx(action)
+    def __init__(self, manager: BaseRLExperienceManager):
+        """
+        Wrap an experience manager.
+        :param manager: experience manager, with its communications registered.
+        """
+        self.manager = manager
+        self.observation_shape = manager._get_observation_shape()
+        self.observation_space = spaces.Box(low=np.zeros(self.observation_shape),
+                                            high=np.ones(self.observation_shape),
+                                            dtype=np.float16)
 
-            def __init__(self):
-                self.observation_shape = outer_self._get_current_observation().shape
-                self.observation_space = spaces.Box(low=np.zeros(self.observation_shape),
-                                                    high=np.ones(self.observation_shape),
-                                                    dtype=np.float16)
+        self.action_space = spaces.Discrete(len(manager._get_action_list()), )
 
-                self.action_space = spaces.Discrete(len(outer_self._get_action_list()), )
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        self.manager._reset()
+        return self.manager._get_current_observation(), self.manager._get_reset_info()
 
-        self.env = CreativeWandWrappedEnv()
-        return self.env
+    def render(self, mode="human"):
+        return self.manager._get_current_observation(and_then_render=True)
 
-    # endregion
+    def step(self, action):
+        obs, reward, done, info = self.manager._execute_action_with_idx(int(action))
+        return obs, reward, done, False, info
@@ -0,0 +1,151 @@
+"""
+EpisodeRecorder.py
+
+Records (obs, action, reward, done, info) transitions of a BaseRLExperienceManager into a ReplayBuffer,
+and converts recorded session logs (LogItem) into transitions for offline RL or imitation learning.
+"""
+from __future__ import annotations
+
+from typing import Callable, Iterator, List
+
+import numpy as np
+
+from CreativeWand.Framework.ExperienceManager.ReplayBuffer import ReplayBuffer
+
+
+class EpisodeRecorder:
+    """
+    Hooks `_execute_action_with_idx()` and `_reset()` of an experience manager to record every step.
+    """
+
+    def __init__(self, manager, buffer: ReplayBuffer):
+        """
+        Start recording.
+        :param manager: BaseRLExperienceManager to record.
+        :param buffer: buffer transitions are added to.
+        """
+        self.manager = manager
+        self.buffer = buffer
+        self._last_obs = None
+        """
+        Copy of the observation the next action is taken in, None at the start of an episode.
+        """
+        self._original_execute = manager._execute_action_with_idx
+        self._original_reset = manager._reset
+        manager._execute_action_with_idx = self._execute_action_with_idx
+        manager._reset = self._reset
+
+    def _execute_action_with_idx(self, idx) -> object:
+        if self._last_obs is None:
+            self._last_obs = np.array(self.manager._get_current_observation(), copy=True)
+        result = self._original_execute(idx)
+        obs, reward, done, info = result
+        self.buffer.add(self._last_obs, int(idx), reward, done, info)
+        # Copied, as observations may be views of a buffer updated on next step.
+        self._last_obs = np.array(obs, copy=True)
+        if done:
+            self.end_episode()
+        return result
+
+    def _reset(self, *args, **kwargs) -> object:
+        # An episode interrupted by a reset is kept, ending on its last observation.
+        self.end_episode()
+        return self._original_reset(*args, **kwargs)
+
+    def end_episode(self) -> None:
+        """
+        End the episode being recorded, if any.
+        :return: None.
+        """
+        if self._last_obs is not None:
+            self.buffer.end_episode(self._last_obs)
+            self._last_obs = None
+
+    def detach(self) -> None:
+        """
+        Stop recording and restore the manager's methods.
+        :return: None.
+        """
+        self.end_episode()
+        self.manager._execute_action_with_idx = self._original_execute
+        self.manager._reset = self._original_reset
+        self.buffer.flush()
+
+
+def comm_action_of(action_names: List[str], key: str = "user_choice_comm") -> Callable:
+    """
+    Build an `action_of` function for `transitions_from_log_item()` reading the communication
+    recorded in manager logs (e.g. "<class '...UserProvideSketch.UserSketchComm'>").
+    :param action_names: class names of the communications, in the order of the action list.
+    :param key: key of manager log items holding the communication.
+    :return: function returning the action index of a manager log item, or None if it has none.
+    """
+    def action_of(item: dict) -> int:
+        recorded = item.get(key)
+        if recorded is None:
+            return None
+        # "<class 'a.b.Name'>" -> "Name"
+        name = str(recorded).strip("<>'").split(".")[-1]
+        return action_names.index(name) if name in action_names else None
+
+    return action_of
+
+
+def transitions_from_log_item(log_item, observe: Callable, action_of: Callable,
+                              reward_of: Callable = None) -> Iterator[tuple]:
+    """
+    Build the transitions of a recorded session from its manager logs (one state dump per interaction).
+    Each log item with an action gives a transition from its observation to the next one with an action;
+    the last action leads to the last log item (the final state dump), or to its own observation again
+    if no log item follows it, and ends the episode.
+    :param log_item: LogItem of the session.
+    :param observe: function turning a manager log item (a state dump) into an observation.
+    :param action_of: function giving the action index of a manager log item, or None to skip it
+        (see `comm_action_of()`).
+    :param reward_of: function (log item, next log item or None) -> reward, default to 0.
+    :return: generator of (obs, action, reward, done, next_obs).
+    """
+    steps = []
+    final_item = None
+    for item in log_item.manager_logs:
+        if not isinstance(item, dict):
+            continue
+        action = action_of(item)
+        if action is not None:
+            steps.append((item, action))
+            final_item = None
+        else:
+            final_item = item
+    for i, (item, action) in enumerate(steps):
+        next_item = steps[i + 1][0] if i + 1 < len(steps) else None
+        obs = observe(item)
+        if next_item is not None:
+            next_obs = observe(next_item)
+        else:
+            next_obs = observe(final_item) if final_item is not None else obs
+        reward = reward_of(item, next_item) if reward_of is not None else 0.0
+        yield obs, action, reward, next_item is None, next_obs
+
+
+def add_log_items(buffer: ReplayBuffer, log_items: list, observe: Callable, action_of: Callable,
+                  reward_of: Callable = None) -> int:
+    """
+    Add recorded sessions to a buffer, one episode per session.
+    :param buffer: buffer to add to.
+    :param log_items: LogItems (e.g. `LogAnalyzer.all_logs`).
+    :param observe: see `transitions_from_log_item()`.
+    :param action_of: see `transitions_from_log_item()`.
+    :param reward_of: see `transitions_from_log_item()`.
+    :return: number of transitions added.
+    """
+    n_added = 0
+    for log_item in log_items:
+        next_obs = None
+        for obs, action, reward, done, next_obs in transitions_from_log_item(log_item, observe, action_of,
+                                                                            reward_of):
+            buffer.add(obs, action, reward, done)
+            n_added += 1
+        if next_obs is not None:
+            buffer.end_episode(next_obs)
+    buffer.flush()
+    return n_added
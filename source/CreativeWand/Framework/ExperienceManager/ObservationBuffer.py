@@ -0,0 +1,120 @@
+"""
+ObservationBuffer.py
+
+A preallocated observation array for RL experience managers, updated incrementally.
+
+An ObservationSpec declares the layout of a flat observation: each ObservationField
+fills one slice from the values of some state keys. The ObservationBuffer only re-encodes
+the slices whose keys changed since the last update, and hands out a read-only view of its array.
+"""
+from __future__ import annotations
+
+from copy import deepcopy
+from typing import Callable, List
+
+import numpy as np
+
+from CreativeWand.Utils.Misc.Equality import values_equal
+
+
+class ObservationField:
+    """
+    One slice of an observation, computed from state values.
+    """
+
+    def __init__(self, name: str, keys: List[str], size: int, encode: Callable):
+        """
+        Declare a field.
+        :param name: name of the field.
+        :param keys: state keys this field is computed from.
+        :param size: number of elements of the slice.
+        :param encode: function taking the values of `keys` (in order, None if unset)
+            and returning `size` numbers (or a scalar if size is 1).
+        """
+        self.name = name
+        self.keys = list(keys)
+        self.size = size
+        self.encode = encode
+        self.slice = None
+        """
+        Slice of the observation filled by this field, set by ObservationSpec.
+        """
+
+
+class ObservationSpec:
+    """
+    Layout of a flat observation: fields placed one after another.
+    """
+
+    def __init__(self, fields: List[ObservationField], dtype=np.float32):
+        """
+        Declare a layout.
+        :param fields: fields of the observation, in order.
+        :param dtype: type of the observation array.
+        """
+        self.fields = list(fields)
+        self.dtype = np.dtype(dtype)
+        offset = 0
+        for field in self.fields:
+            field.slice = slice(offset, offset + field.size)
+            offset += field.size
+        self.shape = (offset,)
+
+    def __getitem__(self, name: str) -> slice:
+        """
+        :param name: name of a field.
+        :return: slice of the observation filled by that field.
+        """
+        for field in self.fields:
+            if field.name == name:
+                return field.slice
+        raise KeyError(name)
+
+
+class ObservationBuffer:
+    """
+    Preallocated observation following an ObservationSpec.
+    """
+
+    def __init__(self, spec: ObservationSpec):
+        """
+        Allocate the buffer.
+        :param spec: layout of the observation.
+        """
+        self.spec = spec
+        self.array = np.zeros(spec.shape, dtype=spec.dtype)
+        self._view = self.array.view()
+        self._view.flags.writeable = False
+        self._last_values = [None] * len(spec.fields)
+        """
+        Values of the keys of each field when it was last encoded, None if never encoded.
+        """
+        self.n_updates = 0
+        """
+        Number of field encodings done, to check how much work updates save.
+        """
+
+    def update(self, get_state: Callable) -> np.ndarray:
+        """
+        Re-encode fields whose state values changed since the last update.
+        :param get_state: function returning the current value of a state key.
+        :return: read-only view of the observation; it changes on next update, so copy it to keep it.
+        """
+        array = self.array
+        for i, field in enumerate(self.spec.fields):
+            values = [get_state(key) for key in field.keys]
+            last_values = self._last_values[i]
+            if last_values is not None and values_equal(last_values, values):
+                continue
+            array[field.slice] = field.encode(*values)
+            # Copied so that values changed in place are detected too.
+            self._last_values[i] = deepcopy(values)
+            self.n_updates += 1
+        return self._view
+
+    def invalidate(self) -> None:
+        """
+        Make the next update re-encode every field.
+        :return: None.
+        """
+        self._last_values = [None] * len(self.spec.fields)
@@ -0,0 +1,240 @@
+"""
+ReplayBuffer.py
+
+A compact, chunked transition store for offline RL and imitation learning, optionally memory-mapped to disk.
+
+Transitions are kept as rows of fixed-size arrays (obs, action, reward, done, and optional info fields),
+split into chunks that are allocated as the buffer grows. The next observation is not stored twice:
+it is the obs of the following row. Each episode therefore ends with a terminal row holding its last
+observation, which is never sampled as a transition itself.
+
+On disk, every chunk field is a `.npy` memmap next to a `meta.json` describing the buffer,
+so that a buffer can be reopened with `ReplayBuffer.open()`.
+"""
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+
+meta_filename = "meta.json"
+
+
+class ReplayBuffer:
+    """
+    Chunked array-backed transition buffer with episode boundaries.
+    """
+
+    def __init__(self, obs_shape: tuple, obs_dtype=np.float32, chunk_size: int = 4096, path: str = None,
+                 info_fields: dict = None):
+        """
+        Create an empty buffer.
+        :param obs_shape: shape of one observation.
+        :param obs_dtype: type observations are stored in (e.g. float16 to halve the size).
+        :param chunk_size: (int) number of rows per chunk.
+        :param path: (str) if not None, directory where chunks are memory-mapped.
+        :param info_fields: (dict) info keys to store, as key -> (shape, dtype), e.g. {"action_mask": ((n,), bool)}.
+        """
+        self.obs_shape = tuple(obs_shape)
+        self.obs_dtype = np.dtype(obs_dtype)
+        self.chunk_size = chunk_size
+        self.path = path
+        self.info_fields = {key: (tuple(shape), np.dtype(dtype)) for key, (shape, dtype) in (info_fields or {}).items()}
+        self.fields = {
+            "obs": (self.obs_shape, self.obs_dtype),
+            "action": ((), np.dtype(np.int64)),
+            "reward": ((), np.dtype(np.float32)),
+            "done": ((), np.dtype(bool)),
+            "valid": ((), np.dtype(bool)),
+            "episode": ((), np.dtype(np.int64)),
+        }
+        """
+        Stored arrays, as name -> (shape of one row, dtype). "valid" is False on terminal rows.
+        """
+        self.fields.update({"info_" + key: value for key, value in self.info_fields.items()})
+        self.chunks = []
+        """
+        List of chunks, each a dict of field name -> (chunk_size, ...) array.
+        """
+        self.size = 0
+        """
+        Number of rows written.
+        """
+        self.n_transitions = 0
+        self.episode_starts = []
+        """
+        First row of every episode.
+        """
+        self._in_episode = False
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    # region writing
+
+    def _allocate_chunk(self) -> dict:
+        index = len(self.chunks)
+        chunk = {}
+        for name, (shape, dtype) in self.fields.items():
+            full_shape = (self.chunk_size,) + shape
+            if self.path is None:
+                chunk[name] = np.zeros(full_shape, dtype=dtype)
+            else:
+                chunk[name] = np.lib.format.open_memmap(self._chunk_file(index, name), mode='w+',
+                                                        dtype=dtype, shape=full_shape)
+        self.chunks.append(chunk)
+        return chunk
+
+    def _chunk_file(self, index: int, name: str) -> str:
+        return os.path.join(self.path, "chunk%05d_%s.npy" % (index, name))
+
+    def _write_row(self, obs, action: int, reward: float, done: bool, valid: bool, info: dict) -> None:
+        chunk_index, offset = divmod(self.size, self.chunk_size)
+        chunk = self.chunks[chunk_index] if chunk_index < len(self.chunks) else self._allocate_chunk()
+        chunk["obs"][offset] = obs
+        chunk["action"][offset] = action
+        chunk["reward"][offset] = reward
+        chunk["done"][offset] = done
+        chunk["valid"][offset] = valid
+        chunk["episode"][offset] = len(self.episode_starts) - 1
+        for key in self.info_fields:
+            if info is not None and key in info:
+                chunk["info_" + key][offset] = info[key]
+        self.size += 1
+
+    def add(self, obs, action: int, reward: float, done: bool, info: dict = None) -> None:
+        """
+        Add a transition to the current episode, starting a new episode if needed.
+        :param obs: observation the action was taken in.
+        :param action: action index.
+        :param reward: reward of the action.
+        :param done: whether the episode ended with this action.
+        :param info: info of the step; only keys in `info_fields` are stored.
+        :return: None.
+        """
+        if not self._in_episode:
+            self.episode_starts.append(self.size)
+            self._in_episode = True
+        self._write_row(obs, action, reward, done, True, info)
+        self.n_transitions += 1
+
+    def end_episode(self, final_obs) -> None:
+        """
+        End the current episode.
+        :param final_obs: observation after the last action, used as its next observation.
+        :return: None.
+        """
+        if not self._in_episode:
+            return
+        self._write_row(final_obs, -1, 0.0, True, False, None)
+        self._in_episode = False
+
+    def flush(self) -> None:
+        """
+        Write memory-mapped chunks and the metadata to disk. Does nothing for in-memory buffers.
+        :return: None.
+        """
+        if self.path is None:
+            return
+        for chunk in self.chunks:
+            for array in chunk.values():
+                array.flush()
+        meta = {
+            "obs_shape": list(self.obs_shape),
+            "obs_dtype": self.obs_dtype.str,
+            "chunk_size": self.chunk_size,
+            "info_fields": {key: [list(shape), dtype.str] for key, (shape, dtype) in self.info_fields.items()},
+            "size": self.size,
+            "n_transitions": self.n_transitions,
+            "episode_starts": self.episode_starts,
+            "in_episode": self._in_episode,
+        }
+        with open(os.path.join(self.path, meta_filename), 'w') as f:
+            json.dump(meta, f)
+
+    @staticmethod
+    def open(path: str, mode: str = 'r+') -> ReplayBuffer:
+        """
+        Reopen a buffer written to disk.
+        :param path: directory of the buffer.
+        :param mode: memmap mode, 'r' for read-only or 'r+' to keep adding to it.
+        :return: opened buffer.
+        """
+        with open(os.path.join(path, meta_filename)) as f:
+            meta = json.load(f)
+        buffer = ReplayBuffer(meta["obs_shape"], obs_dtype=meta["obs_dtype"], chunk_size=meta["chunk_size"],
+                              path=path, info_fields=meta["info_fields"])
+        n_chunks = -(-meta["size"] // meta["chunk_size"])
+        for index in range(n_chunks):
+            buffer.chunks.append({name: np.load(buffer._chunk_file(index, name), mmap_mode=mode)
+                                  for name in buffer.fields})
+        buffer.size = meta["size"]
+        buffer.n_transitions = meta["n_transitions"]
+        buffer.episode_starts = meta["episode_starts"]
+        buffer._in_episode = meta["in_episode"]
+        return buffer
+
+    # endregion writing
+
+    # region reading
+
+    @property
+    def n_episodes(self) -> int:
+        return len(self.episode_starts)
+
+    def get(self, name: str, rows: np.ndarray) -> np.ndarray:
+        """
+        Gather a field for some rows.
+        :param name: field name (obs, action, reward, done, valid, episode or info_<key>).
+        :param rows: int array of row indices.
+        :return: array of shape (len(rows), ...).
+        """
+        shape, dtype = self.fields[name]
+        result = np.empty((len(rows),) + shape, dtype=dtype)
+        chunk_indices, offsets = np.divmod(rows, self.chunk_size)
+        for chunk_index in np.unique(chunk_indices):
+            selected = chunk_indices == chunk_index
+            result[selected] = self.chunks[chunk_index][name][offsets[selected]]
+        return result
+
+    def sample(self, batch_size: int, rng: np.random.Generator = None) -> dict:
+        """
+        Sample random transitions (with replacement).
+        :param batch_size: number of transitions.
+        :param rng: random generator, default to a new one.
+        :return: dict of "obs", "action", "reward", "done", "next_obs" and "info_<key>" arrays.
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        # The last row never has its next observation yet.
+        n_candidates = self.size - 1
+        if self.n_transitions == 0 or n_candidates <= 0:
+            raise ValueError("ReplayBuffer has no complete transition to sample.")
+        rows = np.empty(0, dtype=np.int64)
+        # Terminal rows are rejected; they are a small fraction of the rows.
+        while len(rows) < batch_size:
+            candidates = rng.integers(0, n_candidates, size=2 * (batch_size - len(rows)))
+            rows = np.concatenate([rows, candidates[self.get("valid", candidates)]])
+        rows = rows[:batch_size]
+
+        batch = {name: self.get(name, rows) for name in self.fields if name not in ("valid", "episode")}
+        batch["next_obs"] = self.get("obs", rows + 1)
+        return batch
+
+    def episode(self, index: int) -> dict:
+        """
+        Get all transitions of an episode, in order.
+        :param index: episode index.
+        :return: dict of "obs", "action", "reward", "done", "next_obs" and "info_<key>" arrays.
+        """
+        start = self.episode_starts[index]
+        end = self.episode_starts[index + 1] if index + 1 < self.n_episodes else self.size
+        rows = np.arange(start, end)
+        rows = rows[self.get("valid", rows)]
+        # An episode still being recorded has no next observation for its last row yet.
+        rows = rows[rows + 1 < self.size]
+        episode = {name: self.get(name, rows) for name in self.fields if name not in ("valid", "episode")}
+        episode["next_obs"] = self.get("obs", rows + 1)
+        return episode
+
+    # endregion reading
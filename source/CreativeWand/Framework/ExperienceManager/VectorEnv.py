@@ -0,0 +1,187 @@
+"""
+VectorEnv.py
+
+Vectorized gym environments running N independent experience managers
+(each with its own creative context and frontend), for RL training on all cores.
+
+Both variants take a list of functions, each building a new BaseRLExperienceManager ready to run
+(communications registered, context and frontend bound), and expose batched `reset()` and `step(actions)`
+returning stacked numpy arrays, following the gym >= 0.26 API of the environments.
+An environment whose episode is terminated or truncated is reset automatically;
+its last observation is kept in `info["terminal_observation"]` (and its action mask, if any,
+in `info["terminal_action_mask"]`), while `info["action_mask"]` is the one of the new episode.
+
+SyncVectorEnv steps the environments one after another in this process (useful for debugging),
+SubprocVectorEnv runs each environment in its own process.
+"""
+from __future__ import annotations
+
+import multiprocessing
+from typing import Callable, List
+
+import numpy as np
+
+
+def _make_env(manager_fn: Callable):
+    """
+    Build a manager and its gym environment.
+    :param manager_fn: function returning a BaseRLExperienceManager.
+    :return: gym environment.
+    """
+    return manager_fn()._create_env()
+
+
+def _step_and_reset(env, action) -> tuple:
+    """
+    Step an environment, resetting it if the episode is over.
+    :return: (obs, reward, terminated, truncated, info).
+    """
+    obs, reward, terminated, truncated, info = env.step(action)
+    if terminated or truncated:
+        info = dict(info)
+        # Copied, as observations may be views of a buffer that reset() overwrites.
+        info["terminal_observation"] = np.array(obs, copy=True)
+        obs, reset_info = env.reset()
+        if "action_mask" in info:
+            info["terminal_action_mask"] = info["action_mask"]
+        if "action_mask" in reset_info:
+            info["action_mask"] = reset_info["action_mask"]
+    return obs, reward, terminated, truncated, info
+
+
+def _stack_reset(results: list) -> tuple:
+    """
+    Stack (obs, info) tuples of all environments.
+    :return: (obs array, list of info).
+    """
+    obs, infos = zip(*results)
+    return np.stack(obs), list(infos)
+
+
+def _stack(results: list) -> tuple:
+    """
+    Stack (obs, reward, terminated, truncated, info) tuples of all environments.
+    :return: (obs array, reward array, terminated array, truncated array, list of info).
+    """
+    obs, rewards, terminated, truncated, infos = zip(*results)
+    return np.stack(obs), np.array(rewards, dtype=np.float32), np.array(terminated, dtype=bool), \
+        np.array(truncated, dtype=bool), list(infos)
+
+
+class SyncVectorEnv:
+    """
+    N environments stepped sequentially in the current process.
+    """
+
+    def __init__(self, manager_fns: List[Callable]):
+        """
+        Create the environments.
+        :param manager_fns: list of functions, each returning a new BaseRLExperienceManager.
+        """
+        self.envs = [_make_env(manager_fn) for manager_fn in manager_fns]
+        self.num_envs = len(self.envs)
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+
+    def reset(self) -> tuple:
+        """
+        Reset every environment.
+        :return: (stacked observations of shape (num_envs, *observation shape), list of info).
+        """
+        return _stack_reset([env.reset() for env in self.envs])
+
+    def step(self, actions) -> tuple:
+        """
+        Step every environment with its action.
+        :param actions: one action index per environment.
+        :return: (observations, rewards, terminated, truncated, infos), all but infos stacked along the first axis.
+        """
+        return _stack([_step_and_reset(env, action) for env, action in zip(self.envs, actions)])
+
+    def close(self) -> None:
+        self.envs = []
+
+
+def _worker_main(remote, parent_remote, manager_fn: Callable) -> None:
+    """
+    Subprocess entry point: run one environment, answering commands from the pipe.
+    """
+    parent_remote.close()
+    env = _make_env(manager_fn)
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == "step":
+                remote.send(_step_and_reset(env, data))
+            elif command == "reset":
+                remote.send(env.reset())
+            elif command == "spaces":
+                remote.send((env.observation_space, env.action_space))
+            elif command == "close":
+                break
+            else:
+                raise ValueError("Unknown command %s." % command)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        remote.close()
+
+
+class SubprocVectorEnv:
+    """
+    N environments, each stepped in its own process.
+    """
+
+    def __init__(self, manager_fns: List[Callable], start_method: str = None):
+        """
+        Start one process per environment.
+        :param manager_fns: list of functions, each returning a new BaseRLExperienceManager.
+            They are called in the subprocesses, so must be picklable (e.g. module-level functions)
+            unless the start method is "fork".
+        :param start_method: multiprocessing start method (fork | spawn | forkserver), default to the platform's.
+        """
+        context = multiprocessing.get_context(start_method)
+        self.num_envs = len(manager_fns)
+        self.remotes, work_remotes = zip(*[context.Pipe() for _ in range(self.num_envs)])
+        self.processes = []
+        for remote, work_remote, manager_fn in zip(self.remotes, work_remotes, manager_fns):
+            process = context.Process(target=_worker_main, args=(work_remote, remote, manager_fn), daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+        self.closed = False
+
+        self.remotes[0].send(("spaces", None))
+        self.observation_space, self.action_space = self.remotes[0].recv()
+
+    def reset(self) -> tuple:
+        """
+        Reset every environment.
+        :return: (stacked observations of shape (num_envs, *observation shape), list of info).
+        """
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        return _stack_reset([remote.recv() for remote in self.remotes])
+
+    def step(self, actions) -> tuple:
+        """
+        Step every environment with its action, in parallel.
+        :param actions: one action index per environment.
+        :return: (observations, rewards, terminated, truncated, infos), all but infos stacked along the first axis.
+        """
+        for remote, action in zip(self.remotes, actions):
+            remote.send(("step", int(action)))
+        return _stack([remote.recv() for remote in self.remotes])
+
+    def close(self) -> None:
+        """
+        Stop every process.
+        :return: None.
+        """
+        if self.closed:
+            return
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
@@ -0,0 +1,201 @@
+"""
+SimulatedFrontend.py
+
+A headless frontend answering requests with a simulated user, for high-throughput RL rollouts.
+
+Answers come from a pluggable UserPolicy:
+    ScriptedPolicy   - fixed answers, in order or by request message;
+    ReplayPolicy     - answers recorded in the `frontend_logs` of a session log;
+    StochasticPolicy - answers sampled from given choices.
+Requests and information sent are never formatted to strings nor logged.
+"""
+from __future__ import annotations
+
+import itertools
+import random
+from abc import ABC, abstractmethod
+
+from CreativeWand.Framework.Frontend.BaseFrontEnd import BaseFrontend
+
+_true_strings = {"true", "1", "yes", "y"}
+
+
+def cast_answer(answer: object, cast_to: type = None) -> object:
+    """
+    Cast an answer to the type a request asks for.
+    Recorded answers are strings, so "False" is cast to False rather than to bool("False").
+    :param answer: answer from a policy.
+    :param cast_to: type asked by the request, or None.
+    :return: casted answer.
+    """
+    if cast_to is None or answer is None or isinstance(answer, cast_to):
+        return answer
+    if cast_to is bool and isinstance(answer, str):
+        return answer.strip().lower() in _true_strings
+    return cast_to(answer)
+
+
+class UserPolicy(ABC):
+    """
+    A simulated user deciding answers to requests.
+    """
+
+    @abstractmethod
+    def answer(self, request: object) -> object:
+        """
+        Answer a request.
+        :param request: request from `get_information()`, usually a BaseRequest.
+        :return: answer, casted afterwards to `request.cast_to` if set.
+        """
+        pass
+
+    def reset(self) -> None:
+        """
+        Called when the frontend is reset (e.g. at the start of an episode).
+        :return: None.
+        """
+        pass
+
+
+class ScriptedPolicy(UserPolicy):
+    """
+    Answers from a script: a list answered in order, or a dict of request message -> answer.
+    """
+
+    def __init__(self, answers, default: object = None, cycle: bool = False):
+        """
+        :param answers: (list or dict) answers in order, or answers by request message.
+        :param default: answer when the script has no answer.
+        :param cycle: if True and `answers` is a list, start over once all answers are used.
+        """
+        self.answers = answers
+        self.default = default
+        self.cycle = cycle
+        self._position = 0
+
+    def answer(self, request: object) -> object:
+        if isinstance(self.answers, dict):
+            return self.answers.get(getattr(request, "message", request), self.default)
+        if self._position >= len(self.answers):
+            if not self.cycle or len(self.answers) == 0:
+                return self.default
+            self._position = 0
+        answer = self.answers[self._position]
+        self._position += 1
+        return answer
+
+    def reset(self) -> None:
+        self._position = 0
+
+
+class ReplayPolicy(ScriptedPolicy):
+    """
+    Replays the answers a user gave in a recorded session, in order.
+    """
+
+    def __init__(self, frontend_logs: list, default: object = None, cycle: bool = False):
+        """
+        :param frontend_logs: `frontend_logs` of a session log (e.g. `LogItem.frontend_logs`).
+        :param default: answer once all recorded answers are used.
+        :param cycle: if True, start over once all recorded answers are used.
+        """
+        answers = [item["returned"] for item in frontend_logs if item.get("type") == "get_information"]
+        super().__init__(answers, default=default, cycle=cycle)
+
+    @staticmethod
+    def from_log_file(path: str, **kwargs) -> ReplayPolicy:
+        """
+        Create a policy replaying a session log file.
+        :param path: path of the log file.
+        :param kwargs: passed to `__init__()`.
+        :return: created policy.
+        """
+        from CreativeWand.Utils.LogAnalyzer.LogItem import LogItem
+        return ReplayPolicy(LogItem(from_file=path).frontend_logs, **kwargs)
+
+
+class StochasticPolicy(UserPolicy):
+    """
+    Answers sampled from choices, optionally weighted and per request message.
+    """
+
+    def __init__(self, choices, weights=None, seed: int = None):
+        """
+        :param choices: (list or dict) possible answers, or dict of request message -> possible answers
+            (key None holding the answers for other messages).
+        :param weights: (list or dict) relative weights of the choices, same structure as `choices`;
+            None for uniform.
+        :param seed: random seed.
+        """
+        if not isinstance(choices, dict):
+            choices, weights = {None: choices}, {None: weights}
+        elif weights is None:
+            weights = {}
+        self.choices = choices
+        # Cumulative weights are computed once, sampling is then a bisection.
+        self._cum_weights = {
+            message: list(itertools.accumulate(weights[message])) if weights.get(message) is not None else None
+            for message in choices
+        }
+        self.seed = seed
+        self.rng = random.Random(seed)
+
+    def answer(self, request: object) -> object:
+        message = getattr(request, "message", request)
+        if message not in self.choices:
+            if None not in self.choices:
+                return None
+            message = None
+        choices = self.choices[message]
+        cum_weights = self._cum_weights[message]
+        if cum_weights is None:
+            return choices[int(self.rng.random() * len(choices))]
+        return self.rng.choices(choices, cum_weights=cum_weights)[0]
+
+
+class SimulatedFrontend(BaseFrontend):
+    """
+    Frontend driven by a UserPolicy instead of a human.
+    """
+
+    def __init__(self, policy: UserPolicy):
+        """
+        Initialize this Frontend.
+        :param policy: simulated user answering requests.
+        """
+        super(SimulatedFrontend, self).__init__()
+        self.policy = policy
+        self.n_requests = 0
+        """
+        Number of requests answered since last reset.
+        """
+        self.n_sent = 0
+        """
+        Number of information sent to the user since last reset.
+        """
+        self.last_sent = None
+        """
+        Last information sent to the user, as the object given.
+        """
+
+    def reset(self) -> None:
+        """
+        Reset counters and the policy, e.g. at the start of an episode.
+        :return: None.
+        """
+        self.n_requests = 0
+        self.n_sent = 0
+        self.last_sent = None
+        self.state = {}
+        self.policy.reset()
+
+    def get_information(self, request: object) -> object:
+        self.n_requests += 1
+        return cast_answer(self.policy.answer(request), getattr(request, "cast_to", None))
+
+    def send_information(self, info: object):
+        self.n_sent += 1
+        self.last_sent = info
+
+    def set_information(self, info: object):
+        pass
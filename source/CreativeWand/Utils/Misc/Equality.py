@@ -0,0 +1,31 @@
+"""
+Equality.py
+
+Equality of state values that may contain numpy arrays, for which `==` is element-wise.
+
+"""
+import numpy as np
+
+
+def values_equal(a: object, b: object) -> bool:
+    """
+    Compare two values, recursing into dicts, lists and tuples; numpy arrays are equal
+    if they have the same shape, dtype and elements.
+    :param a: first value.
+    :param b: second value.
+    :return: True if the values are equal.
+    """
+    if a is b:
+        return True
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return isinstance(a, np.ndarray) and isinstance(b, np.ndarray) and a.dtype == b.dtype \
+            and np.array_equal(a, b)
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(values_equal(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)):
+        return type(a) is type(b) and len(a) == len(b) and all(values_equal(x, y) for x, y in zip(a, b))
+    try:
+        return bool(a == b)
+    except (ValueError, TypeError):
+        # e.g. objects holding arrays whose `==` is element-wise.
+        return False
@@ -4,7 +4,12 @@ RemoteAPI.py
 includes utilities to call a REST API.
 """
 import json
+import logging
+
 import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
 
 
 class Response:
@@ -66,7 +71,7 @@ class RemoteAPIInterface():
         while True:
             try:
                 r = requests.post(url=url, data=data)
-                print(r.text)
+                logger.debug(r.text)
                 result = json.loads(r.text)
                 # print("RESULT:%s"%r.text)
                 return result
@@ -95,3 +100,125 @@ class RemoteAPIInterface():
                 if 0 < max_retries <= retries:
                     print("Exception in get request: %s. Max retries reached." % str(e))
                     raise e
+
+
+class PooledRemoteAPIInterface:
+    """
+    Interface for REST API that reuses connections through a connection pool.
+    Use one instance for many requests (it is safe to share between threads).
+    """
+
+    def __init__(self, pool_size: int = 10, max_retries: int = 10):
+        """
+        Initialize the interface.
+        :param pool_size: max number of connections kept open per host.
+        :param max_retries: max attempts for each request.
+        """
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(
+            self,
+            method: str = "POST",
+            address: str = None,
+            data: dict = None,
+    ) -> Response:
+        """
+        Call a REST API using the data dictionary as payload.
+        :param method: (GET/POST) method to use.
+        :param address: URL address of the API.
+        :param data: data payload.
+        :return: Response.
+        """
+        if method not in ["POST", "GET"]:
+            return Response(False, None)
+        if data is None:
+            data = {}
+        if type(data) is dict or type(data) is list:
+            data = json.dumps(data)
+        retries = 0
+        while True:
+            try:
+                if method == "POST":
+                    r = self.session.post(url=address, data=data)
+                else:
+                    r = self.session.get(url=address, params=data)
+                return Response(True, json.loads(r.text))
+            except Exception as e:
+                retries += 1
+                if 0 < self.max_retries <= retries:
+                    logger.warning("Exception in %s request: %s. Max retries reached.", method, str(e))
+                    return Response(False, str(e))
+
+    def close(self) -> None:
+        """
+        Close all pooled connections.
+        :return: None.
+        """
+        self.session.close()
+
+
+class AsyncRemoteAPIInterface:
+    """
+    Interface for REST API to be used from asyncio code. Needs `aiohttp` (`pip install aiohttp`).
+    """
+
+    def __init__(self, pool_size: int = 100, max_retries: int = 10):
+        """
+        Initialize the interface. The underlying session is created on first request.
+        :param pool_size: max number of simultaneous connections.
+        :param max_retries: max attempts for each request.
+        """
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.session = None
+
+    async def request(
+            self,
+            method: str = "POST",
+            address: str = None,
+            data: dict = None,
+    ) -> Response:
+        """
+        Call a REST API using the data dictionary as payload.
+        :param method: (GET/POST) method to use.
+        :param address: URL address of the API.
+        :param data: data payload.
+        :return: Response.
+        """
+        if method not in ["POST", "GET"]:
+            return Response(False, None)
+        if self.session is None:
+            import aiohttp
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size))
+        if data is None:
+            data = {}
+        if type(data) is dict or type(data) is list:
+            data = json.dumps(data)
+        retries = 0
+        while True:
+            try:
+                if method == "POST":
+                    context = self.session.post(address, data=data)
+                else:
+                    context = self.session.get(address, params=data)
+                async with context as r:
+                    text = await r.text()
+                return Response(True, json.loads(text))
+            except Exception as e:
+                retries += 1
+                if 0 < self.max_retries <= retries:
+                    logger.warning("Exception in %s request: %s. Max retries reached.", method, str(e))
+                    return Response(False, str(e))
+
+    async def close(self) -> None:
+        """
+        Close the underlying session.
+        :return: None.
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
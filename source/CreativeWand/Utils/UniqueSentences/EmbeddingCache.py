@@ -0,0 +1,212 @@
+"""
+EmbeddingCache.py
+
+A sentence embedding cache for InferSent, keyed by a hash of the sentence content,
+so that only sentences not seen before are run through the encoder.
+Embeddings are kept in an in-memory LRU, optionally backed by an on-disk memmap store.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class DiskEmbeddingStore:
+    """
+    Append-only embedding store: a preallocated (capacity, dim) float32 memmap
+    plus a key file whose line i is the key of row i. Meant for a single writer process.
+    """
+
+    def __init__(self, path: str, dim: int, capacity: int = 100000):
+        """
+        Open (or create) a store.
+        :param path: directory holding the store.
+        :param dim: embedding dimension.
+        :param capacity: max number of embeddings; once full, new embeddings are not stored.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.matrix_path = os.path.join(path, "embeddings.npy")
+        self.keys_path = os.path.join(path, "keys.txt")
+        if os.path.exists(self.matrix_path):
+            self.matrix = np.load(self.matrix_path, mmap_mode='r+')
+            if self.matrix.shape[1] != dim:
+                raise ValueError("Embedding store %s has dimension %s, expected %s."
+                                 % (path, self.matrix.shape[1], dim))
+        else:
+            self.matrix = np.lib.format.open_memmap(self.matrix_path, mode='w+', dtype=np.float32,
+                                                    shape=(capacity, dim))
+        self.rows = {}
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path) as f:
+                self.rows = {key: row for row, key in enumerate(f.read().split())}
+        self._full_warned = False
+
+    def get(self, key: str) -> np.ndarray:
+        """
+        :param key: sentence key.
+        :return: stored embedding (memmap view), or None.
+        """
+        row = self.rows.get(key)
+        return self.matrix[row] if row is not None else None
+
+    def put(self, keys: list, embeddings: np.ndarray) -> None:
+        """
+        Append embeddings. Keys already stored are skipped.
+        :param keys: list of sentence keys.
+        :param embeddings: (len(keys), dim) array.
+        :return: None.
+        """
+        new = [(key, embedding) for key, embedding in zip(keys, embeddings) if key not in self.rows]
+        room = self.matrix.shape[0] - len(self.rows)
+        if len(new) > room:
+            if not self._full_warned:
+                logger.warning("Embedding store %s is full, new embeddings will not be stored.", self.matrix_path)
+                self._full_warned = True
+            new = new[:room]
+        if not new:
+            return
+        start = len(self.rows)
+        for offset, (_, embedding) in enumerate(new):
+            self.matrix[start + offset] = embedding
+        self.matrix.flush()
+        # Keys are written after the rows they point to.
+        with open(self.keys_path, 'a') as f:
+            f.write("".join(key + "\n" for key, _ in new))
+        for offset, (key, _) in enumerate(new):
+            self.rows[key] = start + offset
+
+
+class EmbeddingCache:
+    """
+    Cached `encode()` for an InferSent model.
+    """
+
+    def __init__(self, model, vocab=None, max_size: int = 10000, disk_path: str = None,
+                 disk_capacity: int = 100000, namespace: str = None):
+        """
+        Create a cache.
+        :param model: InferSent model.
+        :param vocab: if not None, a VocabularyCache; vocabulary is only ensured for sentences not cached.
+        :param max_size: (int) max number of embeddings kept in memory.
+        :param disk_path: (str) if not None, directory of the on-disk store.
+        :param disk_capacity: (int) max number of embeddings in the on-disk store.
+        :param namespace: (str) included in keys, change it when the model weights change.
+            Default to "infersent-v<version>".
+        """
+        self.model = model
+        self.vocab = vocab
+        self.max_size = max_size
+        self.namespace = namespace if namespace is not None else "infersent-v%s" % model.version
+        self.dim = 2 * model.enc_lstm_dim
+        self.disk = DiskEmbeddingStore(disk_path, self.dim, disk_capacity) if disk_path is not None else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+        """
+        Held from `vocab.ensure()` until the model has encoded, so that another call cannot evict
+        or reuse vocabulary rows in between (which would give wrong embeddings).
+        """
+        self.encoder = None
+        """
+        If not None, object with `encode(sentences, bsize, tokenize)` used instead of the model
+        to encode sentences not cached (e.g. an `EncoderPool`).
+        """
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, sentence: str, tokenize: bool = True) -> str:
+        """
+        Content hash of a sentence.
+        :param sentence: sentence.
+        :param tokenize: tokenization changes the embedding, so it is part of the key.
+        :return: hex digest.
+        """
+        content = "%s\x00%s\x00%s" % (self.namespace, int(tokenize), sentence)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def encode(self, sentences: list, bsize: int = 64, tokenize: bool = True) -> np.ndarray:
+        """
+        Same as `model.encode()`, but only sentences without cached embeddings are encoded.
+        :param sentences: list of sentences.
+        :param bsize: batch size used for encoding.
+        :param tokenize: passed to `model.encode()`.
+        :return: (len(sentences), dim) float32 array, in the order of `sentences`.
+        """
+        keys = [self.key(sentence, tokenize) for sentence in sentences]
+        result = np.empty((len(sentences), self.dim), dtype=np.float32)
+
+        missing = OrderedDict()  # key -> index of the first sentence with that key
+        with self._lock:
+            for i, key in enumerate(keys):
+                embedding = self._get(key)
+                if embedding is None:
+                    missing.setdefault(key, i)
+                else:
+                    result[i] = embedding
+            self.misses += len(missing)
+            self.hits += len(sentences) - len(missing)
+
+        if missing:
+            to_encode = [sentences[i] for i in missing.values()]
+            embeddings = None
+            encoder = self.encoder
+            if encoder is not None:
+                try:
+                    embeddings = encoder.encode(to_encode, bsize=bsize, tokenize=tokenize)
+                except Exception as e:
+                    # e.g. a worker of an EncoderPool died or timed out.
+                    logger.warning("Encoder %s failed (%r), encoding in process.", type(encoder).__name__, e)
+            if embeddings is None:
+                with self._encode_lock:
+                    if self.vocab is not None:
+                        self.vocab.ensure(to_encode, tokenize=tokenize)
+                    embeddings = self.model.encode(to_encode, bsize=bsize, tokenize=tokenize)
+            with self._lock:
+                for key, embedding in zip(missing.keys(), embeddings):
+                    self._put_memory(key, embedding)
+                if self.disk is not None:
+                    self.disk.put(list(missing.keys()), embeddings)
+            encoded = dict(zip(missing.keys(), embeddings))
+            for i, key in enumerate(keys):
+                if key in encoded:
+                    result[i] = encoded[key]
+        return result
+
+    def _get(self, key: str) -> np.ndarray:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if self.disk is not None:
+            embedding = self.disk.get(key)
+            if embedding is not None:
+                embedding = np.array(embedding)
+                self._put_memory(key, embedding)
+                return embedding
+        return None
+
+    def _put_memory(self, key: str, embedding: np.ndarray) -> None:
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Statistics of this cache.
+        :return: dict with "size", "disk_size", "hits", "misses" and "hit_rate".
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "disk_size": len(self.disk.rows) if self.disk is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total > 0 else 0.0,
+        }
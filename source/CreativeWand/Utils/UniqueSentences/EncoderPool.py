@@ -0,0 +1,224 @@
+"""
+EncoderPool.py
+
+A pool of worker processes encoding sentences with InferSent, so that encoding is not bound to one GIL.
+
+Workers are forked after the model is loaded, so model weights and word vectors are shared
+copy-on-write instead of being loaded once per worker. Sentence chunks are sent to workers over a queue.
+Once attached (the default), the pool is used transparently by `HighlighterInterface` calls on that model:
+only sentences missing from the model's embedding cache are sent to workers.
+
+If a worker dies (e.g. killed for using too much memory), pending requests fail and the pool detaches
+itself, so that the model encodes in process again.
+
+Fork is only available on POSIX. Create the pool before starting other threads (e.g. a server).
+"""
+from __future__ import annotations
+
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(model, tasks, results, num_threads: int) -> None:
+    """
+    Worker process entry point: encode sentence chunks until None is received.
+    :param model: HighlighterModel inherited from the parent process.
+    :param tasks: queue of (task id, sentences, bsize, tokenize).
+    :param results: queue of (task id, embeddings, error message).
+    :param num_threads: number of intra-op threads torch uses in this worker.
+    """
+    import torch
+    torch.set_num_threads(num_threads)
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, sentences, bsize, tokenize = task
+        try:
+            model.vocab.ensure(sentences, tokenize=tokenize)
+            embeddings = model.infersent.encode(sentences, bsize=bsize, tokenize=tokenize)
+            results.put((task_id, embeddings, None))
+        except Exception as e:
+            # Exceptions are not always picklable, send the message only.
+            results.put((task_id, None, "%s: %s" % (type(e).__name__, e)))
+
+
+class EncoderPool:
+    """
+    Worker processes sharing one loaded HighlighterModel.
+    """
+
+    def __init__(self, model=None, processes: int = None, threads_per_process: int = 1, chunk_size: int = 64,
+                 attach: bool = True, timeout: float = None):
+        """
+        Fork the workers.
+        :param model: HighlighterModel to share, default to the shared model (loaded now if needed).
+        :param processes: (int) number of workers, default to the number of CPUs.
+        :param threads_per_process: (int) intra-op threads torch uses in each worker.
+        :param chunk_size: (int) max number of sentences sent to a worker at once.
+        :param attach: if True, the model's embedding cache encodes through this pool until `close()`.
+        :param timeout: (float) if not None, default max seconds `encode()` waits for each chunk.
+        """
+        if model is None:
+            from .UniqueSentences import get_default_model
+            model = get_default_model()
+        if processes is None:
+            processes = os.cpu_count() or 1
+        self.model = model
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.poll_interval = 0.5
+        """
+        Seconds between checks that workers are alive, when no result arrives.
+        """
+
+        context = multiprocessing.get_context("fork")
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._workers = [
+            context.Process(target=_worker_main, args=(model, self._tasks, self._results, threads_per_process),
+                            daemon=True)
+            for _ in range(processes)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        self._pending = {}
+        """
+        Futures of the chunks sent to workers, keyed by task id.
+        """
+        self._pending_lock = threading.Lock()
+        self._broken = None
+        """
+        Reason the pool stopped working (a worker died), None while it works.
+        """
+        self._task_ids = itertools.count()
+        self._closed = False
+
+        if attach:
+            model.embedding_cache.encoder = self
+        # Started last, as it reads the attributes above (and detaches the pool if a worker died).
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        logger.info("Started %s encoder workers.", processes)
+
+    def _collect(self) -> None:
+        """
+        Hand results from workers to the futures waiting for them, and check that workers are alive.
+        """
+        while True:
+            try:
+                item = self._results.get(timeout=self.poll_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                return
+            if item:
+                task_id, embeddings, error = item
+                with self._pending_lock:
+                    future = self._pending.pop(task_id, None)
+                if future is not None:
+                    if error is not None:
+                        future.set_exception(RuntimeError("Encoder worker failed: %s" % error))
+                    else:
+                        future.set_result(embeddings)
+            self._check_workers()
+
+    def _check_workers(self) -> None:
+        """
+        If a worker died, fail every pending future and detach the pool from the model.
+        The chunk the worker was encoding is lost, and which one it was is not known.
+        """
+        if self._closed or self._broken is not None:
+            return
+        dead = [worker for worker in self._workers if not worker.is_alive()]
+        if not dead:
+            return
+        with self._pending_lock:
+            self._broken = "Encoder worker %s exited with code %s." % (dead[0].pid, dead[0].exitcode)
+            pending, self._pending = self._pending, {}
+        logger.error("%s Falling back to encoding in process.", self._broken)
+        if self.model.embedding_cache.encoder is self:
+            self.model.embedding_cache.encoder = None
+        for future in pending.values():
+            future.set_exception(RuntimeError(self._broken))
+
+    def submit(self, sentences: list, bsize: int = 64, tokenize: bool = True) -> Future:
+        """
+        Send one chunk of sentences to the workers.
+        :param sentences: list of sentences.
+        :param bsize: batch size used for encoding.
+        :param tokenize: passed to `InferSent.encode()`.
+        :return: future of the (len(sentences), dim) embeddings.
+        """
+        if self._closed:
+            raise RuntimeError("EncoderPool is closed.")
+        future = Future()
+        task_id = next(self._task_ids)
+        with self._pending_lock:
+            if self._broken is not None:
+                raise RuntimeError(self._broken)
+            self._pending[task_id] = future
+        self._tasks.put((task_id, sentences, bsize, tokenize))
+        return future
+
+    def encode(self, sentences: list, bsize: int = 64, tokenize: bool = True, timeout: float = None) -> np.ndarray:
+        """
+        Same as `InferSent.encode()`, with chunks of sentences encoded in parallel by the workers.
+        :param sentences: list of sentences.
+        :param bsize: batch size used for encoding.
+        :param tokenize: passed to `InferSent.encode()`.
+        :param timeout: (float) max seconds to wait for each chunk, default to `self.timeout`.
+        :return: (len(sentences), dim) float32 array, in the order of `sentences`.
+        """
+        if len(sentences) == 0:
+            return np.zeros((0, 2 * self.model.infersent.enc_lstm_dim), dtype=np.float32)
+        if timeout is None:
+            timeout = self.timeout
+        futures = [self.submit(sentences[i:i + self.chunk_size], bsize=bsize, tokenize=tokenize)
+                   for i in range(0, len(sentences), self.chunk_size)]
+        try:
+            return np.concatenate([future.result(timeout=timeout) for future in futures])
+        except TimeoutError:
+            # Results arriving later are dropped.
+            with self._pending_lock:
+                self._pending = {task_id: future for task_id, future in self._pending.items()
+                                 if future not in futures}
+            raise
+
+    def close(self) -> None:
+        """
+        Stop the workers and detach the pool from the model.
+        :return: None.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self.model.embedding_cache.encoder is self:
+            self.model.embedding_cache.encoder = None
+        if all(worker.is_alive() for worker in self._workers):
+            for _ in self._workers:
+                self._tasks.put(None)
+        else:
+            # A dead worker may still hold the lock of the task queue, so the others would never get None.
+            for worker in self._workers:
+                worker.terminate()
+        for worker in self._workers:
+            worker.join()
+        self._results.put(None)
+        self._collector.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,124 @@
+"""
+ReducedPrecision.py
+
+Reduced-precision InferSent inference on CPU, and a report of what it costs in highlight accuracy.
+
+Two knobs are available through `HighlighterModel.load()`:
+    quantize=True        - the encoder LSTM (almost all of the compute) runs with dynamic int8 quantization;
+    vocab_dtype=float16  - word vectors are stored in float16, halving vocabulary memory.
+`num_threads` additionally sets the number of intra-op threads torch uses.
+
+`compare_modes()` runs the highlighter in every mode on the same documents and reports
+speed, and agreement of the highlighted sentence with the float32 model.
+
+Usage:
+    python -m CreativeWand.Utils.UniqueSentences.ReducedPrecision <documents.json> [--threads 4]
+where documents.json holds a list of documents, each a list of sentences.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+# name -> HighlighterModel.load() arguments, the first one is the baseline.
+modes = {
+    "float32": {"quantize": False, "vocab_dtype": "float32"},
+    "float16-vocab": {"quantize": False, "vocab_dtype": "float16"},
+    "int8-lstm": {"quantize": True, "vocab_dtype": "float32"},
+    "int8-lstm+float16-vocab": {"quantize": True, "vocab_dtype": "float16"},
+}
+
+report_columns = ["mode", "seconds", "speedup", "agreement", "mean_abs_diff"]
+
+
+def quantize_infersent(infersent):
+    """
+    Apply dynamic int8 quantization to the encoder LSTM of an InferSent model, in place.
+    Weights are quantized once, activations on the fly; only meant for CPU inference.
+    The model is not copied, so word vectors (e.g. a memory-mapped store) stay shared.
+    :param infersent: loaded InferSent model, moved to CPU, set to eval mode and quantized.
+    :return: the same model.
+    """
+    import torch
+    try:
+        from torch.ao.quantization import quantize_dynamic
+    except ImportError:  # torch < 1.10
+        from torch.quantization import quantize_dynamic
+    return quantize_dynamic(infersent.cpu().eval(), {torch.nn.LSTM}, dtype=torch.qint8, inplace=True)
+
+
+def compare_modes(documents: list, mode_names: list = None, num_threads: int = None, **load_kwargs) -> list:
+    """
+    Highlight the same documents in several inference modes and compare them to the first mode.
+    Each mode gets its own model, so no vocabulary or embedding is shared between modes.
+    :param documents: list of sentence lists.
+    :param mode_names: (list) keys of `modes` to run, default all; the first one is the baseline.
+    :param num_threads: (int) if not None, number of intra-op threads torch uses.
+    :param load_kwargs: passed to `HighlighterModel.load()` (e.g. model_path, w2v_path).
+    :return: list of result rows (dicts keyed by `report_columns`).
+    """
+    from .UniqueSentences import HighlighterModel, HighlighterInterface
+
+    if mode_names is None:
+        mode_names = list(modes.keys())
+    documents = [sentences for sentences in documents if len(sentences) > 0]
+
+    rows = []
+    baseline = None
+    for name in mode_names:
+        # Embeddings must be computed by the mode itself, never read back from disk.
+        model = HighlighterModel.load(num_threads=num_threads, embedding_cache_path=None,
+                                      **modes[name], **load_kwargs)
+        # Word vectors are read and the encoder warmed up before timing, so only encoding is measured.
+        # The warmup goes around the embedding cache, which must stay empty.
+        all_sentences = [sentence for sentences in documents for sentence in sentences]
+        model.vocab.ensure(all_sentences, tokenize=True)
+        model.infersent.encode(all_sentences[:model.infersent.bsize], tokenize=True)
+        start_time = time.perf_counter()
+        ranks = HighlighterInterface.rank_many(documents, model=model)
+        elapsed = time.perf_counter() - start_time
+
+        top = np.array([top_indices[0] for _, top_indices in ranks])
+        scores = [scores for scores, _ in ranks]
+        if baseline is None:
+            baseline = elapsed, top, scores
+        base_elapsed, base_top, base_scores = baseline
+        rows.append({
+            "mode": name,
+            "seconds": elapsed,
+            "speedup": base_elapsed / elapsed if elapsed > 0 else float("inf"),
+            "agreement": float(np.mean(top == base_top)) if len(top) > 0 else 1.0,
+            "mean_abs_diff": float(np.mean([np.abs(s - b).mean() for s, b in zip(scores, base_scores)]))
+            if len(scores) > 0 else 0.0,
+        })
+    return rows
+
+
+def format_report(rows: list) -> str:
+    """
+    Format result rows as a text table.
+    :param rows: result rows from `compare_modes()`.
+    :return: table text.
+    """
+    lines = ["%-24s %9s %8s %10s %14s" % tuple(report_columns)]
+    for row in rows:
+        lines.append("%-24s %9.3f %8.2f %10.3f %14.2e" % tuple(row[k] for k in report_columns))
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare reduced-precision highlighter modes to float32.")
+    parser.add_argument("documents", help="json file holding a list of sentence lists")
+    parser.add_argument("--mode", nargs="+", default=list(modes.keys()), choices=list(modes.keys()))
+    parser.add_argument("--threads", type=int, default=None, help="intra-op threads used by torch")
+    parser.add_argument("--model-path", default=None)
+    parser.add_argument("--w2v-path", default=None)
+    args = parser.parse_args()
+
+    with open(args.documents) as f:
+        docs = json.load(f)
+    print(format_report(compare_modes(docs, mode_names=args.mode, num_threads=args.threads,
+                                      model_path=args.model_path, w2v_path=args.w2v_path)))
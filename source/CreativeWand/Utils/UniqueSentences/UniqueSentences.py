@@ -1,88 +1,314 @@
-import torch
+"""
+UniqueSentences.py
+
+Highlights the sentence standing out of a story, using InferSent sentence embeddings.
+
+The InferSent model (and torch, nltk) is only loaded on first use, or when `preload()` is called.
+A model can also be injected with `set_default_model()`, or given to each `HighlighterInterface` call.
+"""
+import functools
+import threading
 from typing import List, Tuple
 import numpy as np
-from scipy.spatial.distance import cosine
-import nltk
 
-from .infersent import InferSent
-from CreativeWand.Application.Config.CreativeContextConfig import highlighter_model_path, highlighter_w2v_path
+from .VocabularyCache import VocabularyCache
+from .EmbeddingCache import EmbeddingCache
 
 V = 2
-MODEL_PATH = highlighter_model_path % V 
 params_model = {'bsize': 64, 'word_emb_dim': 300, 'enc_lstm_dim': 2048,
                 'pool_type': 'max', 'dpout_model': 0.0, 'version': V}
-infersent = InferSent(params_model)
-infersent.load_state_dict(torch.load(MODEL_PATH))
 
-W2V_PATH = highlighter_w2v_path
-infersent.set_w2v_path(W2V_PATH)
+# Max number of words kept in the vocabulary between calls.
+VOCAB_MAX_SIZE = 100000
+
+# Max number of sentence embeddings kept in memory between calls,
+# and an optional directory to also keep them on disk.
+EMBEDDING_CACHE_SIZE = 10000
+EMBEDDING_CACHE_PATH = None
+
+
+class HighlighterModel:
+    """
+    An InferSent model together with the vocabulary and embedding caches used by the highlighter.
+    """
+
+    def __init__(self, infersent, vocab_max_size: int = VOCAB_MAX_SIZE,
+                 embedding_cache_size: int = EMBEDDING_CACHE_SIZE, embedding_cache_path: str = EMBEDDING_CACHE_PATH,
+                 vocab_dtype: str = "float32", namespace: str = None):
+        """
+        Wrap a loaded InferSent model.
+        :param infersent: InferSent model with its w2v path set.
+        :param vocab_max_size: max number of words kept in the vocabulary.
+        :param embedding_cache_size: max number of sentence embeddings kept in memory.
+        :param embedding_cache_path: if not None, directory to also keep sentence embeddings on disk.
+        :param vocab_dtype: float32 | float16, type word vectors are stored in.
+        :param namespace: embedding cache namespace, see `EmbeddingCache`.
+        """
+        self.infersent = infersent
+        self.vocab = VocabularyCache(infersent, max_size=vocab_max_size, dtype=vocab_dtype)
+        self.embedding_cache = EmbeddingCache(infersent, vocab=self.vocab, max_size=embedding_cache_size,
+                                              disk_path=embedding_cache_path, namespace=namespace)
+
+    @staticmethod
+    def load(model_path: str = None, w2v_path: str = None, quantize: bool = False, vocab_dtype: str = "float32",
+             num_threads: int = None, **kwargs):
+        """
+        Load the InferSent model.
+        :param model_path: path of the model weights, default to `highlighter_model_path` in CreativeContextConfig.
+        :param w2v_path: path of the word vectors, default to `highlighter_w2v_path` in CreativeContextConfig.
+        :param quantize: if True, run the encoder LSTM with dynamic int8 quantization (CPU only).
+        :param vocab_dtype: float32 | float16, type word vectors are stored in.
+        :param num_threads: if not None, number of intra-op threads torch uses.
+        :param kwargs: passed to `__init__()`.
+        :return: loaded HighlighterModel.
+        """
+        import torch
+        from .infersent import InferSent
+
+        if model_path is None or w2v_path is None:
+            from CreativeWand.Application.Config.CreativeContextConfig import highlighter_model_path, \
+                highlighter_w2v_path
+            if model_path is None:
+                model_path = highlighter_model_path % V
+            if w2v_path is None:
+                w2v_path = highlighter_w2v_path
+
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+
+        infersent = InferSent(params_model)
+        infersent.load_state_dict(torch.load(model_path))
+        infersent.set_w2v_path(w2v_path)
+        if quantize:
+            from .ReducedPrecision import quantize_infersent
+            infersent = quantize_infersent(infersent)
+        # Embeddings differ between inference modes, so they are cached separately.
+        kwargs.setdefault("namespace", "infersent-v%s-%s-%s" % (V, "int8" if quantize else "float32", vocab_dtype))
+        return HighlighterModel(infersent, vocab_dtype=vocab_dtype, **kwargs)
+
+
+_default_model = None
+_default_model_lock = threading.Lock()
+
+
+def get_default_model() -> HighlighterModel:
+    """
+    Get the shared model, loading it on first call. Thread-safe.
+    :return: the shared HighlighterModel.
+    """
+    global _default_model
+    if _default_model is None:
+        with _default_model_lock:
+            if _default_model is None:
+                _default_model = HighlighterModel.load()
+    return _default_model
+
+
+def preload() -> HighlighterModel:
+    """
+    Load the shared model now instead of on first use (e.g. before a worker starts serving).
+    :return: the shared HighlighterModel.
+    """
+    return get_default_model()
+
+
+def set_default_model(model: HighlighterModel) -> None:
+    """
+    Replace the shared model, e.g. with one loaded elsewhere or a test double.
+    :param model: model to use by default, or None to load it again on next use.
+    :return: None.
+    """
+    global _default_model
+    with _default_model_lock:
+        _default_model = model
+
+
+def outlier_scores(embeddings: np.ndarray, k: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cosine distance of every embedding to the mean embedding, computed with one matrix-vector product.
+    :param embeddings: (n, dim) array.
+    :param k: number of top indices to return, default to all.
+    :return: (scores, top_indices): (n,) distances, and indices of the k largest by decreasing distance
+        (ties keep the lower index first). Zero embeddings get a distance of 0.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float64)
+    mean = embeddings.mean(axis=0)
+    norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(mean)
+    similarities = np.divide(embeddings @ mean, norms, out=np.ones(len(embeddings)), where=norms > 0)
+    scores = 1.0 - similarities
+
+    n = len(scores)
+    if k is None or k >= n:
+        top_indices = np.argsort(-scores, kind='stable')
+    else:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        top_indices = candidates[np.lexsort((candidates, -scores[candidates]))]
+    return scores, top_indices
+
+
+# Max number of sentences whose tokens are kept between calls.
+TOKEN_CACHE_SIZE = 10000
+
+
+@functools.lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _word_tokenize(sentence: str) -> tuple:
+    import nltk
+    return tuple(nltk.word_tokenize(sentence))
+
+
+def extract_nouns(sentences: List[str]) -> Tuple[List[str], List[int]]:
+    """
+    Find the nouns of every sentence, tagging all sentences in one `nltk.pos_tag_sents()` call.
+    Tokens of each sentence are cached between calls.
+    :param sentences: list of sentences.
+    :return: (nouns, noun_sentences): nouns in order of appearance, and the index of the sentence each noun is in.
+    """
+    import nltk
+
+    tagged = nltk.pos_tag_sents([list(_word_tokenize(sentence)) for sentence in sentences])
+    nouns = []
+    noun_sentences = []
+    for index, tags in enumerate(tagged):
+        for word, pos in tags:
+            if pos[:2] == 'NN':
+                nouns.append(word)
+                noun_sentences.append(index)
+    return nouns, noun_sentences
+
+
+def _argmax_or_none(scores: np.ndarray, top_indices: np.ndarray) -> int:
+    # The highlighter reports -1 when nothing is further than 0 from the mean.
+    if len(top_indices) == 0 or not scores[top_indices[0]] > 0:
+        return -1
+    return int(top_indices[0])
+
+
+def __getattr__(name):
+    # Keep `infersent`, `vocab` and `embedding_cache` available as module attributes, loaded on access.
+    if name in ["infersent", "vocab", "embedding_cache"]:
+        return getattr(get_default_model(), name)
+    raise AttributeError("module %s has no attribute %s" % (__name__, name))
+
 
 class HighlighterInterface():
     """
-    
+    Every method takes an optional `model` (a HighlighterModel); the shared default model is used if not given.
     """
 
+    @staticmethod
+    def vocab_stats(model: HighlighterModel = None) -> dict:
+        """
+        Statistics of the vocabulary kept between calls, including its hit rate.
+        :param model: model to use, default to the shared model.
+        :return: see `VocabularyCache.stats()`.
+        """
+        model = model if model is not None else get_default_model()
+        return model.vocab.stats()
+
+    @staticmethod
+    def embedding_cache_stats(model: HighlighterModel = None) -> dict:
+        """
+        Statistics of the sentence embedding cache.
+        :param model: model to use, default to the shared model.
+        :return: see `EmbeddingCache.stats()`.
+        """
+        model = model if model is not None else get_default_model()
+        return model.embedding_cache.stats()
+
+    @staticmethod
+    def rank_with_embeddings(
+        sentences: List[str],
+        k: int = None,
+        model: HighlighterModel = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score every sentence by the cosine distance of its embedding to the mean embedding.
+        :param sentences: list of sentences to compare.
+        :param k: number of top indices to return, default to all.
+        :param model: model to use, default to the shared model.
+        :return: (scores, top_indices), see `outlier_scores()`.
+        """
+        model = model if model is not None else get_default_model()
+        embeddings = model.embedding_cache.encode(sentences, tokenize=True)
+        return outlier_scores(embeddings, k=k)
+
+    @staticmethod
+    def rank_many(
+        documents: List[List[str]],
+        k: int = None,
+        model: HighlighterModel = None,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Same as `rank_with_embeddings()` for many documents at once.
+        Sentences of all documents are encoded together, so they share encoder batches
+        (sorted by length by `InferSent.encode()`), then scores are computed per document.
+        :param documents: list of sentence lists.
+        :param k: number of top indices to return per document, default to all.
+        :param model: model to use, default to the shared model.
+        :return: list of (scores, top_indices), one per document.
+        """
+        model = model if model is not None else get_default_model()
+        all_sentences = [sentence for sentences in documents for sentence in sentences]
+        embeddings = model.embedding_cache.encode(all_sentences, tokenize=True) if all_sentences else None
+
+        results = []
+        start = 0
+        for sentences in documents:
+            end = start + len(sentences)
+            if end > start:
+                results.append(outlier_scores(embeddings[start:end], k=k))
+            else:
+                results.append((np.zeros(0), np.zeros(0, dtype=np.int64)))
+            start = end
+        return results
+
+    @staticmethod
+    def highlight_many(
+        documents: List[List[str]],
+        model: HighlighterModel = None,
+    ) -> List[int]:
+        """
+        Same as `highlight_with_embeddings()` for many documents at once, see `rank_many()`.
+        :param documents: list of sentence lists.
+        :param model: model to use, default to the shared model.
+        :return: index of most dissimilar sentence of each document (-1 for empty documents).
+        """
+        return [_argmax_or_none(scores, top_indices)
+                for scores, top_indices in HighlighterInterface.rank_many(documents, k=1, model=model)]
 
     @staticmethod
     def highlight_with_embeddings(
-        sentences: List[str]
+        sentences: List[str],
+        model: HighlighterModel = None,
     ) -> int:
         """
         Use sentence embeddings to find the sentence most distant from the mean.
         :param sentence: list of sentences to compare.
+        :param model: model to use, default to the shared model.
         :return: index of most dissimilar sentence. 
         """
-        infersent.build_vocab(sentences, tokenize=True)
-        embeddings = infersent.encode(sentences, tokenize=True)
-        mean = np.mean(embeddings, axis=0)
-
-        max_index = -1
-        max_dist = 0
-        for index, embedding in enumerate(embeddings):
-            dist = cosine(embedding, mean)
-            if dist > max_dist:
-                max_dist = dist
-                max_index = index
-
-        return max_index
+        scores, top_indices = HighlighterInterface.rank_with_embeddings(sentences, k=1, model=model)
+        return _argmax_or_none(scores, top_indices)
 
     @staticmethod
     def highlight_with_entities(
-        sentences: List[str]
+        sentences: List[str],
+        model: HighlighterModel = None,
     ) -> Tuple[int, str]:
         """
         Use nouns AND embeddings to find the sentence most distant from the mean.
         :param sentence: list of sentences to compare.
-        :return: index of most standout sentence. 
+        :param model: model to use, default to the shared model.
+        :return: index of most standout sentence and the noun found in it, or (-1, None) if there is no noun.
         """
-        # noun extraction from sentences
-        nouns = []
-        is_noun = lambda pos: pos[:2] == 'NN'
-        for sentence in sentences:
-            tokenized = nltk.word_tokenize(sentence)
-            n = [word for (word, pos) in nltk.pos_tag(tokenized) if is_noun(pos)]
-            nouns += n
+        model = model if model is not None else get_default_model()
+        nouns, noun_sentences = extract_nouns(sentences)
+        if not nouns:
+            return -1, None
 
         # embed nouns
-        infersent.build_vocab(nouns, tokenize=True)
-        embeddings = infersent.encode(nouns, tokenize=True)
-        mean = np.mean(embeddings, axis=0)
-
-        max_index = -1
-        max_dist = 0
-        for index, embedding in enumerate(embeddings):
-            dist = cosine(embedding, mean)
-            if dist > max_dist:
-                max_dist = dist
-                max_index = index
+        embeddings = model.embedding_cache.encode(nouns, tokenize=True)
+        max_index = _argmax_or_none(*outlier_scores(embeddings, k=1))
 
         # choose sentence with farthest noun
-        sentence_index = -1
-        word = nouns[max_index]
-        for index, sentence in enumerate(sentences):
-            if word in sentence:
-                sentence_index = index
-                break
-
-        return sentence_index, word
-
+        return noun_sentences[max_index], nouns[max_index]
@@ -0,0 +1,161 @@
+"""
+VocabularyCache.py
+
+A growing, bounded vocabulary for InferSent that only fetches vectors for new words,
+instead of rebuilding `word_vec` from the w2v file on every call to `build_vocab()`.
+Vectors are kept in one contiguous float32 (or float16) matrix so that `InferSent.get_batch()`
+can gather a whole batch with integer ids.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import numpy as np
+
+
+class VocabularyCache(Mapping):
+    """
+    LRU word -> vector cache installed as `model.word_vec`.
+    It behaves as a read-only dict of word -> vector (a row of `matrix`);
+    row 0 of `matrix` is a zero vector reserved for padding.
+    Words without a w2v vector are remembered too, so they are not looked up again.
+    """
+
+    def __init__(self, model, max_size: int = 100000, initial_capacity: int = 1024, dtype: str = "float32"):
+        """
+        Create the cache and install it on the model.
+        :param model: InferSent model with the w2v path set.
+        :param max_size: (int) max number of words kept (words of the current call are never evicted).
+        :param initial_capacity: (int) number of rows allocated up front; the matrix doubles when full.
+        :param dtype: float32 | float16, type vectors are stored in (batches are always float32).
+        """
+        self.model = model
+        self.max_size = max_size
+        self.matrix = np.zeros((initial_capacity + 1, model.word_emb_dim), dtype=dtype)
+        self.ids = OrderedDict()
+        """
+        word -> row in matrix, in LRU order.
+        """
+        self._free_rows = list(range(initial_capacity, 0, -1))
+        self.unknown_words = OrderedDict()
+        """
+        Words known to have no w2v vector, bounded by max_size as well.
+        """
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.model.word_vec = self
+
+    # region Mapping
+
+    def __getitem__(self, word) -> np.ndarray:
+        return self.matrix[self.ids[word]]
+
+    def __contains__(self, word) -> bool:
+        return word in self.ids
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # endregion Mapping
+
+    def lookup_ids(self, words: list) -> list:
+        """
+        Get the matrix rows of words, which must all be in the vocabulary.
+        :param words: list of words.
+        :return: list of row ids.
+        """
+        ids = self.ids
+        return [ids[word] for word in words]
+
+    def update(self, word_vec: dict) -> None:
+        """
+        Add vectors to the vocabulary (used by `InferSent.update_vocab()`).
+        :param word_vec: dict of word -> vector.
+        :return: None.
+        """
+        with self._lock:
+            for word, vec in word_vec.items():
+                self._set(word, vec)
+
+    def ensure(self, sentences: list, tokenize: bool = True) -> None:
+        """
+        Make sure every word in the sentences is in the vocabulary; replaces `model.build_vocab()`.
+        :param sentences: list of sentences to be encoded.
+        :param tokenize: passed to `model.get_word_dict()`.
+        :return: None.
+        """
+        word_dict = self.model.get_word_dict(sentences, tokenize)
+        with self._lock:
+            new_words = {}
+            for word in word_dict:
+                if word in self.ids:
+                    self.ids.move_to_end(word)
+                elif word in self.unknown_words:
+                    self.unknown_words.move_to_end(word)
+                else:
+                    new_words[word] = ''
+            self.hits += len(word_dict) - len(new_words)
+            self.misses += len(new_words)
+
+            new_word_vec = self.model.get_w2v(new_words) if new_words else {}
+
+            # Words of this call are at the end, so they are never evicted.
+            limit = max(self.max_size, len(word_dict))
+            while self.ids and len(self.ids) + len(new_word_vec) > limit:
+                _, row = self.ids.popitem(last=False)
+                self._free_rows.append(row)
+            for word in new_words:
+                if word in new_word_vec:
+                    self._set(word, new_word_vec[word])
+                else:
+                    self.unknown_words[word] = None
+            while len(self.unknown_words) > limit:
+                self.unknown_words.popitem(last=False)
+
+            # In case something else (e.g. `build_vocab()`) replaced it.
+            self.model.word_vec = self
+
+    def _set(self, word: str, vec: np.ndarray) -> None:
+        if word in self.ids:
+            row = self.ids[word]
+            self.ids.move_to_end(word)
+        else:
+            if not self._free_rows:
+                self._grow()
+            row = self._free_rows.pop()
+            self.ids[word] = row
+        self.matrix[row] = vec
+
+    def _grow(self) -> None:
+        capacity = self.matrix.shape[0] - 1
+        matrix = np.zeros((capacity * 2 + 1, self.matrix.shape[1]), dtype=self.matrix.dtype)
+        matrix[:capacity + 1] = self.matrix
+        self.matrix = matrix
+        self._free_rows.extend(range(capacity * 2, capacity, -1))
+
+    def hit_rate(self) -> float:
+        """
+        Fraction of word lookups served without reading the w2v file.
+        :return: hit rate, 0 if there was no lookup yet.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def stats(self) -> dict:
+        """
+        Statistics of this cache.
+        :return: dict with "size", "unknown_words", "hits", "misses" and "hit_rate".
+        """
+        return {
+            "size": len(self.ids),
+            "unknown_words": len(self.unknown_words),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+        }
@@ -0,0 +1,140 @@
+"""
+WordVectorStore.py
+
+A binary, memory-mapped word vector store to replace parsing GloVe/fastText text files.
+
+`convert_w2v()` turns a text file into:
+    <prefix>.npy   - (n_words, dim) float32/float16 matrix, opened as a read-only memmap;
+    <prefix>.words - one word per line, word on line i is row i of the matrix.
+By default <prefix> is the text file path itself, so that `InferSent.set_w2v_path()` picks the
+converted store up automatically once it exists.
+
+Usage:
+    python -m CreativeWand.Utils.UniqueSentences.WordVectorStore <w2v text file> [--dtype float16]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+
+import numpy as np
+
+# Suffixes of the converted files.
+matrix_suffix = ".npy"
+words_suffix = ".words"
+
+
+def convert_w2v(w2v_path: str, prefix: str = None, dtype: str = "float32") -> str:
+    """
+    Convert a word vector text file ("word v1 v2 ..." per line) to the binary store format.
+    A fastText header line ("n_words dim") and lines of the wrong dimension are skipped;
+    if a word appears more than once, the last vector is kept (as `InferSent.get_w2v()` does).
+    :param w2v_path: path of the text file.
+    :param prefix: prefix of the files to write, default to `w2v_path`.
+    :param dtype: float32 | float16.
+    :return: prefix of the written files.
+    """
+    if prefix is None:
+        prefix = w2v_path
+
+    # First pass: find dimension and the line each word is read from.
+    dim = None
+    line_of_word = {}
+    with open(w2v_path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f):
+            parts = line.rstrip().split(' ', 1)
+            if len(parts) < 2:
+                continue
+            word, vec = parts
+            n_values = vec.count(' ') + 1
+            if dim is None:
+                if n_values == 1:
+                    continue  # fastText header
+                dim = n_values
+            if n_values == dim:
+                line_of_word[word] = line_no
+    # Rows keep the file order, so that the first rows are the most frequent words.
+    words = sorted(line_of_word, key=line_of_word.get)
+    row_of_line = {line_of_word[word]: row for row, word in enumerate(words)}
+    del line_of_word
+
+    # Second pass: fill the matrix.
+    matrix = np.lib.format.open_memmap(prefix + matrix_suffix, mode='w+', dtype=dtype, shape=(len(words), dim))
+    with open(w2v_path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f):
+            if line_no in row_of_line:
+                vec = line.rstrip().split(' ', 1)[1]
+                matrix[row_of_line[line_no]] = np.array(vec.split(' '), dtype=np.float32)
+    matrix.flush()
+    del matrix
+
+    with open(prefix + words_suffix, 'w', encoding='utf-8') as f:
+        f.write("\n".join(words))
+    return prefix
+
+
+class WordVectorStore:
+    """
+    Read-only word vectors backed by a memory-mapped matrix and a word -> row index.
+    Vectors returned are views into the memmap, not copies.
+    """
+
+    def __init__(self, prefix: str):
+        """
+        Open a converted store.
+        :param prefix: prefix given to (or returned by) `convert_w2v()`.
+        """
+        self.prefix = prefix
+        self.vectors = np.load(prefix + matrix_suffix, mmap_mode='r')
+        with open(prefix + words_suffix, encoding='utf-8') as f:
+            self.words = f.read().split("\n")
+        self.index = {word: row for row, word in enumerate(self.words)}
+        self.dim = self.vectors.shape[1]
+
+    @staticmethod
+    def find_prefix(w2v_path: str) -> str:
+        """
+        Find the store belonging to a w2v path.
+        :param w2v_path: path of a text file, of a converted `.npy` matrix, or a prefix.
+        :return: prefix of the store, or None if the path has not been converted.
+        """
+        prefix = w2v_path[:-len(matrix_suffix)] if w2v_path.endswith(matrix_suffix) else w2v_path
+        if os.path.exists(prefix + matrix_suffix) and os.path.exists(prefix + words_suffix):
+            return prefix
+        return None
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def __getitem__(self, word) -> np.ndarray:
+        return self.vectors[self.index[word]]
+
+    def lookup(self, words) -> dict:
+        """
+        Get vectors of the given words.
+        :param words: iterable of words.
+        :return: dict of word -> vector, only for words found in the store.
+        """
+        index = self.index
+        vectors = self.vectors
+        return {word: vectors[index[word]] for word in words if word in index}
+
+    def first_k(self, k: int) -> dict:
+        """
+        Get vectors of the first k words (most frequent words in GloVe/fastText files).
+        :param k: number of words.
+        :return: dict of word -> vector.
+        """
+        return {word: self.vectors[row] for row, word in enumerate(self.words[:k])}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert a word vector text file to a memory-mapped store.")
+    parser.add_argument("w2v_path")
+    parser.add_argument("--prefix", default=None, help="prefix of the output files, default to w2v_path")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    args = parser.parse_args()
+    print("Converted store written to %s" % convert_w2v(args.w2v_path, prefix=args.prefix, dtype=args.dtype))
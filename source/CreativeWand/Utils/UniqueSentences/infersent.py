@@ -15,6 +15,8 @@ import time
 import torch
 import torch.nn as nn
 
+from .WordVectorStore import WordVectorStore
+
 
 class InferSent(nn.Module):
 
@@ -44,6 +46,9 @@ class InferSent(nn.Module):
 
     def is_cuda(self):
         # either all weights are on cpu or they are on gpu
+        # (dynamically quantized LSTMs have no float weights and only run on cpu)
+        if not hasattr(self.enc_lstm, 'bias_hh_l0'):
+            return False
         return self.enc_lstm.bias_hh_l0.data.is_cuda
 
     def forward(self, sent_tuple):
@@ -87,6 +92,9 @@ class InferSent(nn.Module):
 
     def set_w2v_path(self, w2v_path):
         self.w2v_path = w2v_path
+        # use the memory-mapped store if w2v_path has been converted (see WordVectorStore.py)
+        store_prefix = WordVectorStore.find_prefix(w2v_path)
+        self.w2v_store = WordVectorStore(store_prefix) if store_prefix is not None else None
 
     def get_word_dict(self, sentences, tokenize=True):
         # create vocab of words
@@ -102,6 +110,8 @@ class InferSent(nn.Module):
 
     def get_w2v(self, word_dict):
         assert hasattr(self, 'w2v_path'), 'w2v path not set'
+        if self.w2v_store is not None:
+            return self.w2v_store.lookup(word_dict)
         # create word_vec with w2v vectors
         word_vec = {}
         with open(self.w2v_path, encoding='utf-8') as f:
@@ -114,6 +124,10 @@ class InferSent(nn.Module):
 
     def get_w2v_k(self, K):
         assert hasattr(self, 'w2v_path'), 'w2v path not set'
+        if self.w2v_store is not None:
+            word_vec = self.w2v_store.first_k(K + 1)
+            word_vec.update(self.w2v_store.lookup([self.bos, self.eos]))
+            return word_vec
         # create word_vec with k first w2v vectors
         k = 0
         word_vec = {}
@@ -161,16 +175,33 @@ class InferSent(nn.Module):
             new_word_vec = []
         # print('New vocab size : %s (added %s words)'% (len(self.word_vec), len(new_word_vec)))
 
-    def get_batch(self, batch):
+    def get_batch(self, batch, return_mask=False):
         # sent in batch in decreasing order of lengths
         # batch: (bsize, max_len, word_dim)
-        embed = np.zeros((len(batch[0]), len(batch), self.word_emb_dim))
-
-        for i in range(len(batch)):
-            for j in range(len(batch[i])):
-                embed[j, i, :] = self.word_vec[batch[i][j]]
-
-        return torch.FloatTensor(embed)
+        # words are mapped to rows of a contiguous embedding matrix (row 0 is the
+        # zero padding vector) and gathered with a single fancy-indexing op
+        lengths = np.array([len(s) for s in batch])
+        mask = np.arange(lengths.max())[:, None] < lengths[None, :]  # (max_len, bsize)
+        words = [word for sent in batch for word in sent]
+
+        if hasattr(self.word_vec, 'lookup_ids'):
+            matrix = self.word_vec.matrix
+            ids = self.word_vec.lookup_ids(words)
+        else:
+            rows = {word: row for row, word in enumerate(dict.fromkeys(words), 1)}
+            matrix = np.zeros((len(rows) + 1, self.word_emb_dim), dtype=np.float32)
+            matrix[1:] = np.stack([self.word_vec[word] for word in rows])
+            ids = [rows[word] for word in words]
+
+        # transposed mask is sentence-major, matching the order of words
+        index = np.zeros(mask.T.shape, dtype=np.int64)
+        index[mask.T] = ids
+        # gather first, so that only the batch is cast (vectors may be stored in float16)
+        embed = torch.from_numpy(matrix[index.T].astype(np.float32, copy=False))
+
+        if return_mask:
+            return embed, torch.from_numpy(mask)
+        return embed
 
     def tokenize(self, s):
         from nltk.tokenize import word_tokenize